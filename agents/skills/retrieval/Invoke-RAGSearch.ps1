@@ -1,4 +1,3 @@
-
 <#
 .SYNOPSIS
     Searches the EasyWay Wiki using RAG (Qdrant).
@@ -7,15 +6,86 @@
     Uses a python bridge to query the Qdrant vector database.
     Returns relevant documentation chunks.
 
+    If a resident rag_search.py server is running (see Start-RAGSearchServer),
+    the query is sent over its loopback socket and the model load is skipped.
+    Otherwise a one-shot python process is spawned as before.
+
 .PARAMETER Query
     The question or keywords to search for.
 
 .PARAMETER Limit
     Max number of results to return (default 3).
 
+.PARAMETER ServerPort
+    Port of the resident rag_search.py server (default $env:RAG_SEARCH_PORT or 8765).
+
+.PARAMETER Hybrid
+    Fuse BM25 (exact terms: SP names, DAG ids, error codes) with vector results via RRF.
+    Requires the index built by `python3 bm25_index.py build`.
+
+.PARAMETER SnippetChars
+    Return id, score, path and a query-focused snippet of at most this many characters
+    instead of the full chunk content. Use Get-RAGDocument to fetch full content by id.
+
 .EXAMPLE
     Invoke-RAGSearch -Query "How to deploy"
+
+.EXAMPLE
+    Invoke-RAGSearch -Query "sp_insert_user" -Hybrid
+
+.EXAMPLE
+    $hits = Invoke-RAGSearch -Query "How to deploy" -SnippetChars 200
+    Get-RAGDocument -Id $hits[0].id
 #>
+function Send-RAGSearchRequest {
+    [CmdletBinding()]
+    param(
+        [Parameter(Mandatory = $true)]
+        [hashtable]$Request,
+
+        [int]$Port = $(if ($env:RAG_SEARCH_PORT) { [int]$env:RAG_SEARCH_PORT } else { 8765 }),
+
+        [int]$TimeoutMs = 30000
+    )
+
+    # Returns $null when no resident server is listening, so callers can fall back
+    $tcp = New-Object System.Net.Sockets.TcpClient
+    try {
+        try {
+            $connect = $tcp.ConnectAsync("127.0.0.1", $Port)
+            if (-not $connect.Wait(200) -or -not $tcp.Connected) { return $null }
+        }
+        catch {
+            return $null
+        }
+
+        $tcp.ReceiveTimeout = $TimeoutMs
+        $stream = $tcp.GetStream()
+        $utf8 = New-Object System.Text.UTF8Encoding($false)
+        $writer = New-Object System.IO.StreamWriter($stream, $utf8)
+        $reader = New-Object System.IO.StreamReader($stream, $utf8)
+
+        $writer.WriteLine(($Request | ConvertTo-Json -Compress -Depth 5))
+        $writer.Flush()
+        return $reader.ReadLine()
+    }
+    finally {
+        $tcp.Dispose()
+    }
+}
+
+function Start-RAGSearchServer {
+    [CmdletBinding()]
+    param(
+        [int]$Port = $(if ($env:RAG_SEARCH_PORT) { [int]$env:RAG_SEARCH_PORT } else { 8765 })
+    )
+
+    $scriptPath = "$PSScriptRoot/rag_search.py"
+    $proc = Start-Process -FilePath "python3" -ArgumentList @($scriptPath, "--serve", "--port", $Port) -PassThru -NoNewWindow
+    Write-Verbose "Started resident RAG search server (pid $($proc.Id)) on port $Port"
+    return $proc
+}
+
 function Invoke-RAGSearch {
     [CmdletBinding()]
     param(
@@ -23,30 +93,60 @@ function Invoke-RAGSearch {
         [string]$Query,
 
         [Parameter(Mandatory = $false)]
-        [int]$Limit = 3
+        [int]$Limit = 3,
+
+        [Parameter(Mandatory = $false)]
+        [int]$ServerPort = $(if ($env:RAG_SEARCH_PORT) { [int]$env:RAG_SEARCH_PORT } else { 8765 }),
+
+        [Parameter(Mandatory = $false)]
+        [switch]$Hybrid,
+
+        [Parameter(Mandatory = $false)]
+        [int]$SnippetChars = 0,
+
+        # Metadata filter pushed down to the search, e.g. @{ domain = "security" } or @{ section = @("Runbooks", "guides") }
+        [Parameter(Mandatory = $false)]
+        [hashtable]$Filter
     )
 
     try {
-        $scriptPath = "$PSScriptRoot/rag_search.py"
-        
-        # Ensure python calls the script
-        # Pass env vars if needed, though they should be inherited from the container env
-        Write-Verbose "Executing: python3 $scriptPath [query length=$($Query.Length)]"
-
-        # Use & operator to pass $Query as a proper argument (avoids Invoke-Expression
-        # parsing errors when $Query contains JSON braces, colons, or quotes).
-        $jsonOutput = & python3 $scriptPath $Query
-        
+        $mode = if ($Hybrid) { "hybrid" } else { "vector" }
+        $request = @{ query = $Query; limit = $Limit; mode = $mode }
+        if ($SnippetChars -gt 0) { $request.snippet_chars = $SnippetChars }
+        if ($Filter) { $request.filters = $Filter }
+        $jsonOutput = Send-RAGSearchRequest -Request $request -Port $ServerPort
+
+        if (-not $jsonOutput) {
+            $scriptPath = "$PSScriptRoot/rag_search.py"
+
+            # Ensure python calls the script
+            # Pass env vars if needed, though they should be inherited from the container env
+            Write-Verbose "Executing: python3 $scriptPath [query length=$($Query.Length)]"
+
+            # Use & operator to pass $Query as a proper argument (avoids Invoke-Expression
+            # parsing errors when $Query contains JSON braces, colons, or quotes).
+            # Options first, then "--" so a query starting with "-" is not parsed as an option.
+            $pyArgs = @($scriptPath, "--limit", $Limit)
+            if ($Hybrid) { $pyArgs += "--hybrid" }
+            if ($SnippetChars -gt 0) { $pyArgs += @("--snippets", $SnippetChars) }
+            if ($Filter) { $pyArgs += @("--filters", ($Filter | ConvertTo-Json -Compress -Depth 5)) }
+            $pyArgs += @("--", $Query)
+            $jsonOutput = & python3 @pyArgs
+        }
+        else {
+            Write-Verbose "Answered by resident RAG search server on port $ServerPort"
+        }
+
         if (-not $jsonOutput) {
             throw "No output from RAG search script."
         }
-        
+
         $result = $jsonOutput | ConvertFrom-Json
-        
+
         if ($result.PSObject.Properties['error'] -and $result.error) {
             throw "RAG Search Error: $($result.error)"
         }
-        
+
         return $result.results
 
     }
@@ -55,3 +155,103 @@ function Invoke-RAGSearch {
         throw
     }
 }
+
+<#
+.SYNOPSIS
+    Runs many Wiki RAG queries in one call.
+
+.DESCRIPTION
+    All queries are embedded with a single encode call and sent to Qdrant in one
+    batched request. Returns one entry per query: @{ query; results }.
+
+.EXAMPLE
+    Invoke-RAGSearchBatch -Queries @("How to deploy", "Rollback procedure") -Limit 5
+#>
+function Invoke-RAGSearchBatch {
+    [CmdletBinding()]
+    param(
+        [Parameter(Mandatory = $true)]
+        [string[]]$Queries,
+
+        [Parameter(Mandatory = $false)]
+        [int]$Limit = 3,
+
+        [Parameter(Mandatory = $false)]
+        [int]$ServerPort = $(if ($env:RAG_SEARCH_PORT) { [int]$env:RAG_SEARCH_PORT } else { 8765 })
+    )
+
+    try {
+        $jsonOutput = Send-RAGSearchRequest -Request @{ queries = $Queries; limit = $Limit } -Port $ServerPort
+
+        if (-not $jsonOutput) {
+            $scriptPath = "$PSScriptRoot/rag_search.py"
+            Write-Verbose "Executing: python3 $scriptPath --batch [$($Queries.Count) queries]"
+
+            # The query list goes through stdin as a JSON array (no per-query process)
+            $jsonOutput = ConvertTo-Json -InputObject @($Queries) -Compress | & python3 $scriptPath --batch --limit $Limit
+        }
+
+        if (-not $jsonOutput) {
+            throw "No output from RAG search script."
+        }
+
+        $result = $jsonOutput | ConvertFrom-Json
+
+        if ($result.PSObject.Properties['error'] -and $result.error) {
+            throw "RAG Search Error: $($result.error)"
+        }
+
+        return $result.results
+    }
+    catch {
+        Write-Error "Failed to invoke RAG batch search: $_"
+        throw
+    }
+}
+
+<#
+.SYNOPSIS
+    Fetches the full content of Wiki chunks by point id.
+
+.DESCRIPTION
+    Companion of Invoke-RAGSearch -SnippetChars: search returns ids + snippets,
+    full content is only transferred for the hits that are actually needed.
+
+.EXAMPLE
+    Get-RAGDocument -Id "3f1c2d9e-..."
+#>
+function Get-RAGDocument {
+    [CmdletBinding()]
+    param(
+        [Parameter(Mandatory = $true)]
+        [string[]]$Id,
+
+        [Parameter(Mandatory = $false)]
+        [int]$ServerPort = $(if ($env:RAG_SEARCH_PORT) { [int]$env:RAG_SEARCH_PORT } else { 8765 })
+    )
+
+    try {
+        $jsonOutput = Send-RAGSearchRequest -Request @{ op = "fetch"; ids = $Id } -Port $ServerPort
+
+        if (-not $jsonOutput) {
+            $scriptPath = "$PSScriptRoot/rag_search.py"
+            $jsonOutput = & python3 $scriptPath --fetch @Id
+        }
+
+        if (-not $jsonOutput) {
+            throw "No output from RAG search script."
+        }
+
+        $result = $jsonOutput | ConvertFrom-Json
+
+        if ($result.PSObject.Properties['error'] -and $result.error) {
+            throw "RAG Fetch Error: $($result.error)"
+        }
+
+        return $result.results
+    }
+    catch {
+        Write-Error "Failed to fetch RAG documents: $_"
+        throw
+    }
+}
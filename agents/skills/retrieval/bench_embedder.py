@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Embedder Benchmark (PyTorch vs ONNX Runtime)
+
+parity      Encodes Wiki chunks and recipe queries with the torch reference and each
+            ONNX backend. Reports per-vector cosine / max abs difference and top-k
+            agreement when ONNX query vectors search torch-embedded chunks (what
+            happens against existing collections). Exits 1 when a backend falls
+            below --min-cosine (fp32) / --min-cosine-int8.
+throughput  Cold load (fresh process: imports + model init), single-query latency
+            and encode throughput (texts/sec) per backend and batch size.
+
+Both modes need the ONNX export: `python3 embedder.py export`.
+
+Usage:
+    python3 bench_embedder.py parity [--chunks 512] [--k 10] [--json]
+    python3 bench_embedder.py throughput [--chunks 512] [--batch-sizes 1 32 128] [--json]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+import embedder
+from bench_rag_search import load_recipe_queries, percentile
+
+ONNX_BACKENDS = ["onnx", "onnx-int8"]
+
+
+def load_wiki_chunks(limit):
+    from bm25_index import DEFAULT_WIKI_PATH, chunk_markdown
+
+    texts = []
+    for file in sorted(Path(DEFAULT_WIKI_PATH).rglob("*.md")):
+        content = file.read_text(encoding="utf-8", errors="replace")
+        texts.extend(content[start:end] for _, start, end in chunk_markdown(content))
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+
+def top_k(scores, k):
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+# --- parity ---
+def run_parity(args):
+    chunks = load_wiki_chunks(args.chunks)
+    queries = load_recipe_queries(args.queries)
+    reference = embedder.get_embedder(args.model, "torch")
+    ref_chunks = np.asarray(reference.encode(chunks, batch_size=64, normalize_embeddings=True), dtype=np.float32)
+    ref_queries = np.asarray(reference.encode(queries, normalize_embeddings=True), dtype=np.float32)
+    truth = top_k(ref_queries @ ref_chunks.T, args.k)
+
+    report = {"model": args.model, "chunks": len(chunks), "queries": len(queries), "k": args.k, "backends": {}}
+    for backend in ONNX_BACKENDS:
+        try:
+            model = embedder.get_embedder(args.model, backend)
+        except FileNotFoundError as e:
+            report["backends"][backend] = {"error": str(e)}
+            continue
+        vectors = np.asarray(model.encode(chunks, batch_size=64, normalize_embeddings=True), dtype=np.float32)
+        query_vectors = np.asarray(model.encode(queries, normalize_embeddings=True), dtype=np.float32)
+        cosine = np.concatenate([(vectors * ref_chunks).sum(axis=1), (query_vectors * ref_queries).sum(axis=1)])
+        found = top_k(query_vectors @ ref_chunks.T, args.k)
+        threshold = args.min_cosine_int8 if backend == "onnx-int8" else args.min_cosine
+        report["backends"][backend] = {
+            "min_cosine": round(float(cosine.min()), 6),
+            "mean_cosine": round(float(cosine.mean()), 6),
+            "max_abs_diff": float(np.abs(vectors - ref_chunks).max()),
+            f"topk_agreement_at_{args.k}": round(float(np.mean(
+                [len(set(f) & set(t)) / args.k for f, t in zip(found, truth)])), 4),
+            "threshold": threshold,
+            "passed": bool(cosine.min() >= threshold),
+        }
+    return report
+
+
+# --- throughput ---
+def measure_cold_load(model_name, backend):
+    """Fresh interpreter: import the backend, load the model, encode one query."""
+    code = ("import time; t = time.perf_counter(); import embedder; "
+            f"embedder.get_embedder({model_name!r}, {backend!r}).encode('warm-up'); "
+            "print((time.perf_counter() - t) * 1000)")
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=False,
+                          cwd=str(Path(__file__).resolve().parent))
+    if proc.returncode != 0:
+        return None
+    return round(float(proc.stdout.strip().splitlines()[-1]), 2)
+
+
+def run_throughput(args):
+    chunks = load_wiki_chunks(args.chunks)
+    queries = load_recipe_queries(args.queries) or ["how do I deploy"]
+    report = {"model": args.model, "chunks": len(chunks), "backends": {}}
+
+    for backend in ["torch"] + ONNX_BACKENDS:
+        try:
+            model = embedder.get_embedder(args.model, backend)
+        except FileNotFoundError as e:
+            report["backends"][backend] = {"error": str(e)}
+            continue
+        model.encode(queries[:8])  # warm-up (lazy allocations, graph optimization)
+
+        latencies = []
+        for query in queries[:args.runs]:
+            started = time.perf_counter()
+            model.encode(query)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+
+        result = {
+            "cold_load_ms": measure_cold_load(args.model, backend),
+            "query_p50_ms": percentile(latencies, 50),
+            "query_p95_ms": percentile(latencies, 95),
+            "texts_per_sec": {},
+        }
+        for batch_size in args.batch_sizes:
+            started = time.perf_counter()
+            model.encode(chunks, batch_size=batch_size)
+            elapsed = time.perf_counter() - started
+            result["texts_per_sec"][str(batch_size)] = round(len(chunks) / elapsed, 1)
+        report["backends"][backend] = result
+
+    torch_tps = report["backends"].get("torch", {}).get("texts_per_sec", {})
+    for backend in ONNX_BACKENDS:
+        tps = report["backends"][backend].get("texts_per_sec", {})
+        report["backends"][backend]["speedup_vs_torch"] = {
+            b: round(tps[b] / torch_tps[b], 2) for b in tps if torch_tps.get(b)}
+    return report
+
+
+def print_parity_report(report):
+    print(f"🔍 Embedder parity vs torch ({report['chunks']} chunks, {report['queries']} queries, k={report['k']})")
+    for backend, r in report["backends"].items():
+        if "error" in r:
+            print(f"   {backend:<10} ❌ {r['error']}")
+            continue
+        status = "✅" if r["passed"] else "❌"
+        agreement = r[f"topk_agreement_at_{report['k']}"]
+        print(f"   {backend:<10} {status} min cos {r['min_cosine']:.6f}  mean {r['mean_cosine']:.6f}"
+              f"  max |Δ| {r['max_abs_diff']:.2e}  top-{report['k']} agreement {agreement:.3f}")
+
+
+def print_throughput_report(report):
+    print(f"🔍 Embedder throughput ({report['chunks']} chunks)")
+    for backend, r in report["backends"].items():
+        if "error" in r:
+            print(f"   {backend:<10} ❌ {r['error']}")
+            continue
+        tps = "  ".join(f"b{b}: {v:>7.1f}/s" for b, v in r["texts_per_sec"].items())
+        print(f"   {backend:<10} cold {r['cold_load_ms'] or 0:>8.0f} ms  query p50 {r['query_p50_ms']:>6.2f} ms  {tps}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedder backends")
+    parser.add_argument("mode", choices=["parity", "throughput"])
+    parser.add_argument("--model", default=embedder.DEFAULT_MODEL)
+    parser.add_argument("--chunks", type=int, default=512, help="Wiki chunks to encode")
+    parser.add_argument("--queries", type=int, default=200, help="Recipe queries to encode")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-cosine", type=float, default=0.9999)
+    parser.add_argument("--min-cosine-int8", type=float, default=0.98)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32, 128])
+    parser.add_argument("--runs", type=int, default=50, help="Single-query latency samples")
+    parser.add_argument("--json", action="store_true", help="Output pure JSON")
+    args = parser.parse_args()
+
+    if args.mode == "parity":
+        report = run_parity(args)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_parity_report(report)
+        failed = [b for b, r in report["backends"].items() if not r.get("passed")]
+        sys.exit(1 if failed else 0)
+
+    report = run_throughput(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_throughput_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+RAG Search Benchmark
+
+startup  Compares one-shot `rag_search.py <query>` processes (model loaded per call)
+         against the resident `rag_search.py --stdio` mode (model loaded once).
+suite    Latency/recall suite for rag_search.search, chroma_bridge.query_knowledge and
+         KnowledgeBaseManager.search over a reproducible local corpus: the Wiki chunked
+         like ingest_wiki.js, indexed into embedded Qdrant and Chroma. Queries come
+         from the intents/questions of agents/kb/recipes.jsonl. Reports cold start,
+         p50/p95/p99, throughput with N concurrent clients and recall@k vs exact search.
+
+quantization
+         Memory and recall of int8 scalar-quantized vectors (local_index.py --dtype int8)
+         vs float32 on the suite corpus, with and without full-precision rescoring.
+
+Usage:
+    python3 bench_rag_search.py startup [--runs 5] [--json]
+    python3 bench_rag_search.py quantization [--corpus DIR] [--k 5] [--json]
+    python3 bench_rag_search.py suite [--corpus DIR] [--max-files N] [--queries N]
+                                      [--k 5] [--clients 4] [--out report.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.normpath(os.path.join(SCRIPT_DIR, "..", "..", ".."))
+RAG_SEARCH = os.path.join(SCRIPT_DIR, "rag_search.py")
+RECIPES_FILE = os.path.join(REPO_ROOT, "agents", "kb", "recipes.jsonl")
+DEFAULT_CORPUS_DIR = os.path.expanduser("~/.cache/easyway/bench_corpus")
+
+SUITE_TARGETS = ["rag_search", "chroma_bridge", "kb_manager"]
+
+DEFAULT_QUERIES = [
+    "how do I deploy",
+    "setup local environment",
+    "qdrant api key",
+    "rollback a failed release",
+    "agent governance rules",
+]
+
+
+def summarize(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        "runs": len(ordered),
+        "mean_ms": round(statistics.mean(ordered), 2),
+        "p50_ms": round(ordered[len(ordered) // 2], 2),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+def bench_one_shot(queries, runs):
+    samples = []
+    for i in range(runs):
+        query = queries[i % len(queries)]
+        started = time.perf_counter()
+        subprocess.run([sys.executable, RAG_SEARCH, query], capture_output=True, check=False)
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def bench_resident(queries, runs):
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, RAG_SEARCH, "--stdio"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1,
+    )
+    ready = json.loads(proc.stdout.readline())
+    startup_ms = (time.perf_counter() - started) * 1000
+
+    samples = []
+    try:
+        for i in range(runs):
+            query = queries[i % len(queries)]
+            started = time.perf_counter()
+            proc.stdin.write(json.dumps({"query": query}) + "\n")
+            proc.stdin.flush()
+            proc.stdout.readline()
+            samples.append((time.perf_counter() - started) * 1000)
+    finally:
+        proc.stdin.close()
+        proc.wait(timeout=30)
+
+    result = summarize(samples)
+    result["startup_ms"] = round(startup_ms, 2)
+    result["warmup_ms"] = ready.get("warmup_ms")
+    return result
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(ordered))))
+    return round(ordered[min(rank, len(ordered)) - 1], 2)
+
+
+# --- suite: corpus + query set ---
+def load_recipe_queries(limit=None):
+    queries = []
+    with open(RECIPES_FILE, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                recipe = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if recipe.get("question"):
+                queries.append(recipe["question"])
+            if recipe.get("intent"):
+                queries.append(recipe["intent"].replace("-", " "))
+    queries = list(dict.fromkeys(queries))
+    return queries[:limit] if limit else queries
+
+
+def build_corpus(corpus_dir, max_files=None):
+    """Chunk + embed the Wiki once and index it into embedded Qdrant and Chroma."""
+    import numpy as np
+    import chromadb
+    from qdrant_client import QdrantClient, models
+    import rag_search
+    from bm25_index import DEFAULT_WIKI_PATH, chunk_markdown, doc_key
+
+    corpus = Path(corpus_dir)
+    corpus.mkdir(parents=True, exist_ok=True)
+
+    keys, texts, payloads = [], [], []
+    files = sorted(Path(DEFAULT_WIKI_PATH).rglob("*.md"))[:max_files]
+    for file in files:
+        content = file.read_text(encoding="utf-8", errors="replace")
+        for chunk_index, start, end in chunk_markdown(content):
+            path = file.as_posix()
+            keys.append(doc_key(path, chunk_index))
+            texts.append(content[start:end])
+            payloads.append({"filename": file.name, "path": path, "content": content[start:end], "chunk_index": chunk_index})
+
+    started = time.perf_counter()
+    vectors = rag_search.get_model().encode(texts, batch_size=64, normalize_embeddings=True)
+    encode_s = time.perf_counter() - started
+    np.save(corpus / "vectors.npy", vectors.astype(np.float32))
+    with open(corpus / "keys.json", "w", encoding="utf-8") as f:
+        json.dump(keys, f)
+
+    qdrant = QdrantClient(path=str(corpus / "qdrant"))
+    qdrant.recreate_collection(
+        collection_name=rag_search.COLLECTION_NAME,
+        vectors_config=models.VectorParams(size=vectors.shape[1], distance=models.Distance.COSINE),
+    )
+    for b in range(0, len(keys), 256):
+        qdrant.upsert(rag_search.COLLECTION_NAME, points=[
+            models.PointStruct(id=str(uuid.uuid5(uuid.NAMESPACE_URL, key)), vector=vec.tolist(), payload=payload)
+            for key, vec, payload in zip(keys[b:b + 256], vectors[b:b + 256], payloads[b:b + 256])
+        ])
+    qdrant.close()
+
+    chroma = chromadb.PersistentClient(path=str(corpus / "chroma"))
+    try:
+        chroma.delete_collection("easyway_knowledge")
+    except Exception:
+        pass
+    collection = chroma.get_or_create_collection(name="easyway_knowledge")
+    for b in range(0, len(keys), 1000):
+        collection.add(
+            ids=keys[b:b + 1000],
+            documents=texts[b:b + 1000],
+            embeddings=vectors[b:b + 1000].tolist(),
+            metadatas=[{"filename": p["filename"], "path": p["path"]} for p in payloads[b:b + 1000]],
+        )
+
+    return {"files": len(files), "chunks": len(keys), "encode_s": round(encode_s, 2)}
+
+
+def configure_corpus_env(corpus_dir):
+    """Point every target at the embedded corpus (must run before the modules are imported)."""
+    os.environ["QDRANT_PATH"] = str(Path(corpus_dir) / "qdrant")
+    os.environ["CHROMA_PATH"] = str(Path(corpus_dir) / "chroma")
+    os.environ["RAG_BACKEND"] = "qdrant"
+    os.environ.setdefault("RAG_EMBEDDING_CACHE", "off")
+    # Every target must search on every query: the other targets have no result cache,
+    # and repeated queries in the concurrent pass would otherwise measure cache hits
+    os.environ["RAG_RESULT_CACHE_SIZE"] = "0"
+
+
+def make_target(name, corpus_dir):
+    """Return fn(query, k) -> [doc keys] for one retrieval path."""
+    if name == "rag_search":
+        import rag_search
+        from bm25_index import doc_key
+
+        def run(query, k):
+            response = rag_search.search(query, k)
+            if "error" in response:
+                raise RuntimeError(response["error"])
+            return [doc_key(r["path"], r["chunk_index"]) for r in response["results"]]
+        return run
+
+    if name == "chroma_bridge":
+        sys.path.insert(0, os.path.join(REPO_ROOT, "scripts", "python"))
+        import chroma_bridge
+        return lambda query, k: [r["id"] for r in chroma_bridge.query_knowledge(query, k)]
+
+    if name == "kb_manager":
+        sys.path.insert(0, os.path.join(REPO_ROOT, "scripts", "ai-agent"))
+        from chromadb_manager import KnowledgeBaseManager
+        kb = KnowledgeBaseManager(persist_dir=str(Path(corpus_dir) / "chroma"))
+        return lambda query, k: [r["doc_id"] for r in kb.search(query, k)["results"]]
+
+    raise ValueError(f"Unknown target: {name}")
+
+
+def exact_ground_truth(corpus_dir, queries, k):
+    import numpy as np
+    import rag_search
+
+    vectors = np.load(Path(corpus_dir) / "vectors.npy")
+    with open(Path(corpus_dir) / "keys.json", encoding="utf-8") as f:
+        keys = json.load(f)
+    q = np.asarray(rag_search.get_model().encode(queries, normalize_embeddings=True), dtype=np.float32)
+    scores = q @ vectors.T
+    top = np.argsort(-scores, axis=1)[:, :k]
+    return [[keys[i] for i in row] for row in top]
+
+
+# --- suite: measurements ---
+def measure_cold_start(target, corpus_dir, query, k):
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "cold", "--target", target, "--corpus", corpus_dir,
+         "--k", str(k), "--query", query],
+        capture_output=True, text=True, check=False,
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    return {"cold_start_ms": round(elapsed_ms, 2), "ok": proc.returncode == 0}
+
+
+def bench_target(run, queries, k, clients, truth):
+    run(queries[0], k)  # warm-up: model + client loaded, not part of steady state
+
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        found = run(query, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len(set(found) & set(expected)) / max(len(expected), 1))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(lambda q: run(q, k), queries))
+    concurrent_s = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "queries": len(queries),
+        "p50_ms": percentile(ordered, 50),
+        "p95_ms": percentile(ordered, 95),
+        "p99_ms": percentile(ordered, 99),
+        "mean_ms": round(statistics.mean(ordered), 2),
+        "throughput_qps": round(len(queries) / concurrent_s, 2),
+        "clients": clients,
+        f"recall_at_{k}": round(statistics.mean(recalls), 4),
+    }
+
+
+def run_suite(args):
+    configure_corpus_env(args.corpus)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "k": args.k,
+        "clients": args.clients,
+        "corpus_dir": args.corpus,
+    }
+
+    if args.rebuild or not (Path(args.corpus) / "keys.json").exists():
+        report["corpus"] = build_corpus(args.corpus, args.max_files)
+
+    queries = load_recipe_queries(args.queries)
+    report["query_count"] = len(queries)
+
+    # Cold starts run in fresh processes before this process opens the embedded stores
+    cold = {t: measure_cold_start(t, args.corpus, queries[0], args.k) for t in args.targets}
+
+    truth = exact_ground_truth(args.corpus, queries, args.k)
+    report["targets"] = {}
+    for target in args.targets:
+        result = {"cold_start_ms": cold[target]["cold_start_ms"], "cold_start_ok": cold[target]["ok"]}
+        try:
+            result.update(bench_target(make_target(target, args.corpus), queries, args.k, args.clients, truth))
+        except Exception as e:
+            result["error"] = str(e)
+        report["targets"][target] = result
+
+    return report
+
+
+def run_cold(args):
+    """Child process of measure_cold_start: import, init, one query."""
+    configure_corpus_env(args.corpus)
+    make_target(args.target, args.corpus)(args.query, args.k)
+
+
+def print_suite_report(report):
+    print(f"🔍 RAG retrieval suite ({report['query_count']} queries, k={report['k']}, {report['clients']} clients)")
+    for target, r in report["targets"].items():
+        if "error" in r:
+            print(f"   {target:<14} ❌ {r['error']}")
+            continue
+        recall = r[f"recall_at_{report['k']}"]
+        print(f"   {target:<14} cold {r['cold_start_ms']:>8.0f} ms  p50 {r['p50_ms']:>7.2f}  p95 {r['p95_ms']:>7.2f}"
+              f"  p99 {r['p99_ms']:>7.2f} ms  {r['throughput_qps']:>7.1f} q/s  recall@{report['k']} {recall:.3f}")
+
+
+# --- quantization ---
+def run_quantization(args):
+    """int8 vs float32 on the suite corpus: bytes, recall@k (raw / rescored), per-query latency."""
+    import numpy as np
+    import rag_search
+    from local_index import blockwise_scores, quantize_int8, top_k
+
+    configure_corpus_env(args.corpus)
+    vectors = np.load(Path(args.corpus) / "vectors.npy")
+    quantized, scales = quantize_int8(vectors)
+    queries = load_recipe_queries(args.queries)
+    q = np.asarray(rag_search.get_model().encode(queries, normalize_embeddings=True), dtype=np.float32)
+    k = args.k
+
+    started = time.perf_counter()
+    truth = top_k(q @ vectors.T, k)
+    float_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    started = time.perf_counter()
+    approx_scores = blockwise_scores(q, quantized, scales)
+    int8_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    def recall(found):
+        return round(float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])), 4)
+
+    report = {
+        "vectors": int(vectors.shape[0]),
+        "dim": int(vectors.shape[1]),
+        "k": k,
+        "queries": len(queries),
+        "float32_bytes": int(vectors.nbytes),
+        "int8_bytes": int(quantized.nbytes + scales.nbytes),
+        "memory_saved_pct": round(100 * (1 - (quantized.nbytes + scales.nbytes) / vectors.nbytes), 2),
+        "float32_scan_ms_per_query": round(float_ms, 3),
+        "int8_scan_ms_per_query": round(int8_ms, 3),
+        f"recall_at_{k}_int8_only": recall(top_k(approx_scores, k)),
+        "rescored": {},
+    }
+    for oversampling in (1, 2, 4, 8):
+        candidates = top_k(approx_scores, k * oversampling)
+        found = []
+        for qi, rows in enumerate(candidates):
+            exact = vectors[rows] @ q[qi]
+            found.append(rows[np.argsort(-exact)[:k]])
+        report["rescored"][f"oversampling_{oversampling}"] = {f"recall_at_{k}": recall(found)}
+    return report
+
+
+def print_startup_report(report):
+    one_shot, resident = report["one_shot"], report["resident"]
+    print("🔍 RAG search: startup vs steady state")
+    print(f"   One-shot process   p50 {one_shot['p50_ms']:>9.2f} ms  mean {one_shot['mean_ms']:>9.2f} ms")
+    print(f"   Resident startup       {resident['startup_ms']:>9.2f} ms  (model+client warm-up {resident['warmup_ms']} ms)")
+    print(f"   Resident per query p50 {resident['p50_ms']:>9.2f} ms  mean {resident['mean_ms']:>9.2f} ms")
+    if resident["p50_ms"] > 0:
+        print(f"   Speed-up (p50)         {one_shot['p50_ms'] / resident['p50_ms']:>9.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rag_search.py")
+    parser.add_argument("mode", choices=["startup", "suite", "quantization", "cold"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Output pure JSON")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="Re-index the corpus even if present")
+    parser.add_argument("--max-files", type=int, help="Index only the first N Wiki files")
+    parser.add_argument("--queries", type=int, help="Use only the first N recipe queries")
+    parser.add_argument("--targets", nargs="+", choices=SUITE_TARGETS, default=SUITE_TARGETS)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--out", help="Write the suite report as JSON to this file")
+    parser.add_argument("--target", choices=SUITE_TARGETS, help=argparse.SUPPRESS)
+    parser.add_argument("--query", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode == "cold":
+        run_cold(args)
+        return
+
+    if args.mode == "quantization":
+        print(json.dumps(run_quantization(args), indent=2))
+        return
+
+    if args.mode == "suite":
+        report = run_suite(args)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_suite_report(report)
+        return
+
+    report = {
+        "one_shot": bench_one_shot(DEFAULT_QUERIES, args.runs),
+        "resident": bench_resident(DEFAULT_QUERIES, args.runs),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_startup_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+CLI Startup Benchmark
+Wall-clock time of each rag_search.py / chromadb_manager.py subcommand in a fresh
+interpreter, plus a `python -X importtime` breakdown of where the import time
+goes (top-level modules by cumulative time).
+
+Subcommands marked "light" must not import chromadb, qdrant_client or the
+embedding model; they fail the run when their median exceeds --budget-ms.
+Searches are measured as they run in practice: the first run warms the
+embedding cache, so the median reflects a cached query embedding.
+
+Usage:
+    python3 bench_startup.py [--runs 5] [--budget-ms 1000] [--top 12] [--only rag_search|chromadb_manager] [--json]
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from bench_rag_search import REPO_ROOT, SCRIPT_DIR, summarize
+
+KB_MANAGER = os.path.join(REPO_ROOT, "scripts", "ai-agent", "chromadb_manager.py")
+RAG_SEARCH = os.path.join(SCRIPT_DIR, "rag_search.py")
+
+# (cli, subcommand name, argv, light)
+SUBCOMMANDS = [
+    ("rag_search", "usage-error", [RAG_SEARCH], True),
+    ("rag_search", "help", [RAG_SEARCH, "--help"], True),
+    ("rag_search", "cache-stats", [RAG_SEARCH, "--cache-stats"], True),
+    ("rag_search", "search-local", [RAG_SEARCH, "--backend", "local", "how do I deploy"], False),
+    ("rag_search", "search", [RAG_SEARCH, "how do I deploy"], False),
+    ("chromadb_manager", "usage-error", [KB_MANAGER], True),
+    ("chromadb_manager", "cache-stats", [KB_MANAGER, "cache-stats"], True),
+    ("chromadb_manager", "search", [KB_MANAGER, "search", "how do I deploy"], False),
+]
+
+HEAVY_MODULES = ("chromadb", "qdrant_client", "sentence_transformers", "torch", "onnxruntime", "transformers")
+
+# import time:       self [us] |      cumulative | imported package
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def run_once(argv, extra_flags=()):
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, *extra_flags, *argv], capture_output=True, text=True, check=False,
+                          cwd=SCRIPT_DIR)
+    return (time.perf_counter() - started) * 1000, proc
+
+
+def import_breakdown(argv, top):
+    """Top-level imports (direct imports of the script) by cumulative ms, and heavy modules seen."""
+    _, proc = run_once(argv, ("-X", "importtime"))
+    top_level, seen = [], set()
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_RE.match(line)
+        if not m:
+            continue
+        cumulative_us, indent, module = int(m.group(2)), len(m.group(3)), m.group(4)
+        seen.add(module.split(".")[0])
+        if indent == 1:  # one space after '|' = imported by the script itself
+            top_level.append((module, cumulative_us))
+    top_level.sort(key=lambda item: item[1], reverse=True)
+    return {
+        "imports_total_ms": round(sum(us for _, us in top_level) / 1000, 2),
+        "top_imports_ms": {module: round(us / 1000, 2) for module, us in top_level[:top]},
+        "heavy_modules": sorted(m for m in seen if m in HEAVY_MODULES),
+    }
+
+
+def run_benchmark(args):
+    report = {"python": sys.version.split()[0], "runs": args.runs, "budget_ms": args.budget_ms, "subcommands": []}
+    for cli, name, argv, light in SUBCOMMANDS:
+        if args.only and cli != args.only:
+            continue
+        run_once(argv)  # warm-up: OS page cache, .pyc files, embedding cache
+        samples, exit_code = [], 0
+        for _ in range(args.runs):
+            ms, proc = run_once(argv)
+            samples.append(ms)
+            exit_code = proc.returncode
+        entry = {"cli": cli, "subcommand": name, "light": light, "exit_code": exit_code,
+                 **summarize(samples), **import_breakdown(argv, args.top)}
+        if light:
+            entry["within_budget"] = entry["p50_ms"] <= args.budget_ms and not entry["heavy_modules"]
+        report["subcommands"].append(entry)
+    report["passed"] = all(e.get("within_budget", True) for e in report["subcommands"])
+    return report
+
+
+def print_report(report):
+    print(f"🔍 CLI startup (python {report['python']}, {report['runs']} runs, budget {report['budget_ms']} ms)")
+    for e in report["subcommands"]:
+        status = "" if not e["light"] else ("✅" if e["within_budget"] else "❌")
+        heavy = f"  heavy: {', '.join(e['heavy_modules'])}" if e["heavy_modules"] else ""
+        print(f"   {e['cli']:<17} {e['subcommand']:<13} p50 {e['p50_ms']:>8.1f} ms  max {e['max_ms']:>8.1f} ms"
+              f"  imports {e['imports_total_ms']:>8.1f} ms  exit {e['exit_code']} {status}{heavy}")
+        for module, ms in list(e["top_imports_ms"].items())[:5]:
+            print(f"      {ms:>8.1f} ms  {module}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI startup time per subcommand")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1000, help="p50 budget for light subcommands")
+    parser.add_argument("--top", type=int, default=12, help="Top-level imports reported per subcommand")
+    parser.add_argument("--only", choices=["rag_search", "chromadb_manager"])
+    parser.add_argument("--json", action="store_true", help="Output pure JSON")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+BM25 Wiki Index
+Local inverted index over the Wiki markdown corpus, chunked exactly like
+scripts/ingest_wiki.js so every entry maps 1:1 to a point in `easyway_wiki`.
+Used by rag_search.py for hybrid (BM25 + vector) retrieval with RRF.
+
+On-disk layout (directory):
+    meta.json      params, vocabulary {term: [offset, df]}, chunk table
+    postings.bin   uint32 chunk ids for every term, then uint16 term frequencies
+    doclen.bin     uint32 token count per chunk
+
+Usage:
+    python3 bm25_index.py build [--wiki <dir>] [--out <dir>]
+    python3 bm25_index.py search <query> [--limit 5]
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+from array import array
+from pathlib import Path
+
+from result_cache import bump_version
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WIKI_PATH = os.getenv("WIKI_PATH", os.path.join(SCRIPT_DIR, "..", "..", "..", "Wiki"))
+DEFAULT_INDEX_PATH = os.getenv("RAG_BM25_INDEX", "~/.cache/easyway/bm25_wiki")
+
+# Same chunking rule as ingest_wiki.js: split on blank lines, keep chunks > 50 chars
+CHUNK_SPLIT = re.compile(r"\n\s*\n")
+MIN_CHUNK_CHARS = 50
+
+# Identifiers like sp_insert_user, dag-stg-to-ref or ERR.1234 stay whole;
+# their parts are indexed too so partial lookups still match.
+TOKEN_RE = re.compile(r"[a-z0-9_]+(?:[-.][a-z0-9_]+)*")
+SUBTOKEN_RE = re.compile(r"[-._]")
+
+LEADING_DOTS = re.compile(r"^(?:\.{1,2}/)+")
+
+# Front matter fields copied into the payload by ingest_wiki.js (pageMetadata)
+FRONT_MATTER_RE = re.compile(r"^---\r?\n([\s\S]*?)\r?\n---")
+TAGS_RE = re.compile(r"^tags:\s*\[(.*)\]\s*$", re.MULTILINE)
+TYPE_RE = re.compile(r"^type:\s*(\S+)\s*$", re.MULTILINE)
+
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if SUBTOKEN_RE.search(token):
+            tokens.extend(part for part in SUBTOKEN_RE.split(token) if part)
+    return tokens
+
+
+def chunk_markdown(content):
+    """Yield (chunk_index, start, end) with the same indices ingest_wiki.js assigns."""
+    index = 0
+    pos = 0
+    for match in list(CHUNK_SPLIT.finditer(content)) + [None]:
+        end = match.start() if match else len(content)
+        piece = content[pos:end]
+        stripped = piece.strip()
+        if len(stripped) > MIN_CHUNK_CHARS:
+            lead = len(piece) - len(piece.lstrip())
+            yield index, pos + lead, pos + lead + len(stripped)
+            index += 1
+        if match:
+            pos = match.end()
+
+
+def page_metadata(path, content, wiki_root):
+    """Filterable payload fields of a Wiki page, computed like ingest_wiki.js: section, tags, type, domain."""
+    parts = Path(os.path.relpath(path, wiki_root)).parts
+    if len(parts) > 1 and parts[0].endswith(".wiki"):
+        parts = parts[1:]
+    meta = {"section": parts[0] if len(parts) > 1 else "root", "tags": []}
+    front_matter = FRONT_MATTER_RE.match(content)
+    if front_matter:
+        tags = TAGS_RE.search(front_matter.group(1))
+        if tags:
+            meta["tags"] = [t for t in (t.strip().strip("'\"") for t in tags.group(1).split(",")) if t]
+        page_type = TYPE_RE.search(front_matter.group(1))
+        if page_type:
+            meta["type"] = page_type.group(1)
+    domain = next((t for t in meta["tags"] if t.startswith("domain/") and len(t) > len("domain/")), None)
+    if domain:
+        meta["domain"] = domain[len("domain/"):]
+    return meta
+
+
+def doc_key(path, chunk_index):
+    """Location-independent key shared by Qdrant payloads and BM25 chunks."""
+    path = str(path).replace("\\", "/")
+    if "Wiki/" in path:
+        path = path.split("Wiki/", 1)[1]
+    return f"{LEADING_DOTS.sub('', path)}#{chunk_index}"
+
+
+class BM25Index:
+    def __init__(self, chunks, vocab, postings_ids, postings_tfs, doc_lengths, wiki_root):
+        self.chunks = chunks            # [[path, chunk_index, start, end], ...]
+        self.vocab = vocab              # {term: [offset, df]}
+        self.postings_ids = postings_ids
+        self.postings_tfs = postings_tfs
+        self.doc_lengths = doc_lengths
+        self.wiki_root = wiki_root
+        self._page_meta = {}            # path -> page_metadata(), filled by filtered queries
+        self.avg_len = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+    # --- build / persist ---
+    @classmethod
+    def build(cls, wiki_root=DEFAULT_WIKI_PATH):
+        wiki_root = os.path.abspath(wiki_root)
+        chunks, doc_lengths = [], array("I")
+        term_postings = {}
+
+        for file in sorted(Path(wiki_root).rglob("*.md")):
+            content = file.read_text(encoding="utf-8", errors="replace")
+            # Stored the way ingest_wiki.js stores `path`: <wiki root>/<relative path>
+            file_path = Path(wiki_root, file.relative_to(wiki_root)).as_posix()
+            for chunk_index, start, end in chunk_markdown(content):
+                chunk_id = len(chunks)
+                chunks.append([file_path, chunk_index, start, end])
+                tokens = tokenize(content[start:end])
+                doc_lengths.append(len(tokens))
+                counts = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for term, tf in counts.items():
+                    term_postings.setdefault(term, []).append((chunk_id, min(tf, 0xFFFF)))
+
+        vocab, postings_ids, postings_tfs = {}, array("I"), array("H")
+        for term in sorted(term_postings):
+            entries = term_postings[term]
+            vocab[term] = [len(postings_ids), len(entries)]
+            postings_ids.extend(chunk_id for chunk_id, _ in entries)
+            postings_tfs.extend(tf for _, tf in entries)
+
+        return cls(chunks, vocab, postings_ids, postings_tfs, doc_lengths, wiki_root)
+
+    def save(self, out_dir=DEFAULT_INDEX_PATH):
+        out = Path(out_dir).expanduser()
+        out.mkdir(parents=True, exist_ok=True)
+        with open(out / "postings.bin", "wb") as f:
+            self.postings_ids.tofile(f)
+            self.postings_tfs.tofile(f)
+        with open(out / "doclen.bin", "wb") as f:
+            self.doc_lengths.tofile(f)
+        meta = {
+            "version": 1,
+            "k1": K1,
+            "b": B,
+            "wiki_root": self.wiki_root,
+            "postings": len(self.postings_ids),
+            "chunks": self.chunks,
+            "vocab": self.vocab,
+        }
+        with open(out / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, separators=(",", ":"))
+        return out
+
+    @classmethod
+    def load(cls, index_dir=DEFAULT_INDEX_PATH):
+        src = Path(index_dir).expanduser()
+        with open(src / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        postings_ids, postings_tfs, doc_lengths = array("I"), array("H"), array("I")
+        with open(src / "postings.bin", "rb") as f:
+            postings_ids.fromfile(f, meta["postings"])
+            postings_tfs.fromfile(f, meta["postings"])
+        with open(src / "doclen.bin", "rb") as f:
+            doc_lengths.fromfile(f, len(meta["chunks"]))
+        return cls(meta["chunks"], meta["vocab"], postings_ids, postings_tfs, doc_lengths, meta["wiki_root"])
+
+    # --- query ---
+    def search(self, query, limit=5):
+        """Return [(chunk_id, score)] best first."""
+        n_docs = len(self.chunks)
+        scores = {}
+        for term in set(tokenize(query)):
+            entry = self.vocab.get(term)
+            if entry is None:
+                continue
+            offset, df = entry
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for i in range(offset, offset + df):
+                chunk_id = self.postings_ids[i]
+                tf = self.postings_tfs[i]
+                norm = K1 * (1 - B + B * self.doc_lengths[chunk_id] / self.avg_len)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def chunk_key(self, chunk_id):
+        path, chunk_index, _, _ = self.chunks[chunk_id]
+        return doc_key(path, chunk_index)
+
+    def chunk_metadata(self, chunk_id):
+        """Payload fields of a chunk without its content (for metadata filters)."""
+        path, chunk_index, _, _ = self.chunks[chunk_id]
+        page = self._page_meta.get(path)
+        if page is None:
+            try:
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    content = f.read()
+            except OSError:
+                content = ""
+            page = self._page_meta[path] = page_metadata(path, content, self.wiki_root)
+        return {"filename": os.path.basename(path), "path": path, "chunk_index": chunk_index, **page}
+
+    def chunk_hit(self, chunk_id, score):
+        """Result dict shaped like rag_search hits; content is read back from the Wiki file.
+
+        `id` is None here: the point id lives in the vector store (rag_search.resolve_point_ids).
+        """
+        path, chunk_index, start, end = self.chunks[chunk_id]
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                content = f.read()[start:end]
+        except OSError:
+            content = None
+        return {
+            "id": None,
+            "filename": os.path.basename(path),
+            "content": content,
+            "score": score,
+            "path": path,
+            "chunk_index": chunk_index,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 index over the EasyWay Wiki")
+    parser.add_argument("command", choices=["build", "search"])
+    parser.add_argument("query", nargs="*")
+    parser.add_argument("--wiki", default=DEFAULT_WIKI_PATH)
+    parser.add_argument("--out", "--index", dest="index", default=DEFAULT_INDEX_PATH)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        index = BM25Index.build(args.wiki)
+        out = index.save(args.index)
+        bump_version("bm25_index.py")
+        print(json.dumps({
+            "status": "built",
+            "index": str(out),
+            "chunks": len(index.chunks),
+            "terms": len(index.vocab),
+            "postings": len(index.postings_ids),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        }))
+        return
+
+    if not args.query:
+        print(json.dumps({"error": "No query provided"}))
+        sys.exit(1)
+
+    started = time.perf_counter()
+    index = BM25Index.load(args.index)
+    load_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    hits = index.search(" ".join(args.query), args.limit)
+    query_ms = (time.perf_counter() - started) * 1000
+    print(json.dumps({
+        "results": [index.chunk_hit(chunk_id, score) for chunk_id, score in hits],
+        "load_ms": round(load_ms, 2),
+        "query_ms": round(query_ms, 2),
+    }))
+
+
+if __name__ == "__main__":
+    main()
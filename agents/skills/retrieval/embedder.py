@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Pluggable Embedders
+One `encode()` interface (the subset of SentenceTransformer.encode used by the
+retrieval scripts) over interchangeable inference backends:
+
+    torch      SentenceTransformer on PyTorch (reference implementation)
+    onnx       ONNX Runtime session over the same weights, exported once
+    onnx-int8  the ONNX graph with dynamically int8-quantized weights
+
+The ONNX backends reproduce the SentenceTransformer pipeline (same tokenizer,
+truncation, pooling and normalization), so their vectors can be queried against
+collections embedded with the torch path. They only need onnxruntime, numpy and
+tokenizers at run time: PyTorch is imported by `export` alone.
+
+Selected with RAG_EMBEDDER (default: torch). Parity and throughput against the
+torch path: bench_embedder.py.
+
+Usage:
+    python3 embedder.py export [--model all-MiniLM-L6-v2] [--out DIR] [--no-int8]
+    python3 embedder.py encode [--backend onnx] "some text" ...
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_BACKEND = os.getenv("RAG_EMBEDDER", "torch")
+DEFAULT_ONNX_DIR = os.getenv("RAG_ONNX_DIR", "~/.cache/easyway/onnx")
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+
+# ONNX Runtime intra-op threads (0 = runtime default, one per physical core)
+ONNX_THREADS = int(os.getenv("RAG_ONNX_THREADS", 0))
+
+
+def onnx_model_dir(model_name=DEFAULT_MODEL, onnx_dir=DEFAULT_ONNX_DIR):
+    return Path(onnx_dir).expanduser() / model_name.replace("/", "__")
+
+
+def cache_namespace(model_name=DEFAULT_MODEL, backend=DEFAULT_BACKEND):
+    """Embedding-cache namespace: torch and fp32 ONNX vectors are interchangeable, int8 ones are not."""
+    return f"{model_name}@{backend}" if backend == "onnx-int8" else model_name
+
+
+def get_embedder(model_name=DEFAULT_MODEL, backend=DEFAULT_BACKEND):
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbedder(onnx_model_dir(model_name), quantized=backend == "onnx-int8")
+    raise ValueError(f"Unknown embedder backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+class OffsetTokenizer:
+    """`tokenizers.Tokenizer` behind the slice of the HF tokenizer call used for chunking
+    (offset mapping without special tokens), so chunkers work with either backend."""
+
+    is_fast = True
+
+    def __init__(self, tokenizer):
+        self._tokenizer = tokenizer
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=True, **_):
+        encoding = self._tokenizer.encode(text, add_special_tokens=add_special_tokens)
+        return {"input_ids": encoding.ids, "offset_mapping": encoding.offsets}
+
+
+class OnnxEmbedder:
+    def __init__(self, model_dir, quantized=False):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = Path(model_dir)
+        model_file = self.model_dir / ("model.int8.onnx" if quantized else "model.onnx")
+        if not model_file.exists():
+            raise FileNotFoundError(f"{model_file} not found: run `embedder.py export` first")
+        with open(self.model_dir / "config.json", encoding="utf-8") as f:
+            self.config = json.load(f)
+
+        self.max_seq_length = self.config["max_seq_length"]
+        self._tokenizer = Tokenizer.from_file(str(self.model_dir / "tokenizer.json"))
+        self._tokenizer.enable_truncation(self.max_seq_length)
+        self._tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+        # Offsets for chunking come from an untruncated copy
+        chunking = Tokenizer.from_file(str(self.model_dir / "tokenizer.json"))
+        chunking.no_truncation()
+        chunking.no_padding()
+        self.tokenizer = OffsetTokenizer(chunking)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(str(model_file), options, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dim"]
+
+    def _forward(self, texts):
+        encodings = self._tokenizer.encode_batch(texts)
+        mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {"input_ids": np.asarray([e.ids for e in encodings], dtype=np.int64), "attention_mask": mask}
+        if "token_type_ids" in self._inputs:
+            feed["token_type_ids"] = np.asarray([e.type_ids for e in encodings], dtype=np.int64)
+        hidden = self.session.run(None, feed)[0]
+
+        if self.config["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        else:  # mean over real (non-padding) tokens
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        if self.config["normalize"]:
+            pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled.astype(np.float32)
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False, **_):
+        """Same contract as SentenceTransformer.encode: one string -> 1-D array, list -> 2-D."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        out = np.empty((len(texts), self.config["dim"]), dtype=np.float32)
+        # Length-sorted batches keep padding small (SentenceTransformer does the same)
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            out[rows] = self._forward([texts[i] for i in rows])
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
+
+
+def export_onnx(model_name=DEFAULT_MODEL, out_dir=None, int8=True, opset=17):
+    """Export the transformer of a SentenceTransformer model to ONNX (+ int8 copy)."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out = Path(out_dir).expanduser() if out_dir else onnx_model_dir(model_name)
+    out.mkdir(parents=True, exist_ok=True)
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer, tokenizer = st[0].auto_model.eval(), st.tokenizer
+
+    pooling = next((m for m in st if type(m).__name__ == "Pooling"), None)
+    mode = "mean"
+    if pooling is not None:  # sentence-transformers >= 6 exposes pooling_mode, older releases a method
+        mode = getattr(pooling, "pooling_mode", None) or pooling.get_pooling_mode_str()
+    if mode not in ("mean", "cls"):
+        raise ValueError(f"Unsupported pooling mode for ONNX export: {mode}")
+
+    sample = tokenizer(["export sample", "a longer export sample sentence"], padding=True, return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    axes = {n: {0: "batch", 1: "sequence"} for n in names}
+    axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    class _Encoder(torch.nn.Module):
+        # Keyword call: positional order of forward() differs across transformers releases
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(names, inputs)), return_dict=True).last_hidden_state
+
+    with torch.no_grad():
+        torch.onnx.export(_Encoder(), tuple(sample[n] for n in names), str(out / "model.onnx"),
+                          input_names=names, output_names=["last_hidden_state"], dynamic_axes=axes,
+                          opset_version=opset, dynamo=False)
+
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(out / "model.onnx"), str(out / "model.int8.onnx"), weight_type=QuantType.QInt8)
+
+    tokenizer.backend_tokenizer.save(str(out / "tokenizer.json"))
+    config = {
+        "model_name": model_name,
+        "dim": (getattr(st, "get_embedding_dimension", None) or st.get_sentence_embedding_dimension)(),
+        "max_seq_length": st.max_seq_length,
+        "pooling": mode,
+        "normalize": any(type(m).__name__ == "Normalize" for m in st),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+    }
+    with open(out / "config.json", "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return {"status": "exported", "dir": str(out), "int8": int8, **config}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding backends (PyTorch / ONNX Runtime)")
+    parser.add_argument("command", choices=["export", "encode"])
+    parser.add_argument("text", nargs="*")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--out", help="Export directory (default: RAG_ONNX_DIR/<model>)")
+    parser.add_argument("--no-int8", action="store_true", help="Skip the int8-quantized copy")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(json.dumps(export_onnx(args.model, args.out, int8=not args.no_int8)))
+        return
+
+    vectors = get_embedder(args.model, args.backend).encode(args.text)
+    print(json.dumps({"backend": args.backend, "vectors": np.asarray(vectors).tolist()}))
+
+
+if __name__ == "__main__":
+    main()
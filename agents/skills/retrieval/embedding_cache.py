@@ -0,0 +1,161 @@
+"""
+Query Embedding Cache
+Two-level cache for sentence embeddings keyed by (model name, normalized text):
+an in-process LRU in front of a SQLite file shared by every process on the host.
+
+Used by rag_search.py and scripts/ai-agent/chromadb_manager.py so repeated
+queries ("how do I deploy") never reach the encoder twice.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = os.getenv("RAG_EMBEDDING_CACHE", "~/.cache/easyway/embeddings.sqlite")
+DEFAULT_MAX_BYTES = int(os.getenv("RAG_EMBEDDING_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+DEFAULT_LRU_SIZE = 1024
+
+# Size check on disk runs every N inserts, not on every insert
+_EVICTION_CHECK_EVERY = 64
+
+
+def normalize_text(text):
+    """Whitespace/unicode normalization applied before keying (never changes meaning)."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model_name, text):
+    digest = hashlib.sha1(f"{model_name}\0{normalize_text(text)}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, model_name, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, lru_size=DEFAULT_LRU_SIZE):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.lru_size = lru_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        self.path = None
+        self._db = None
+        if path and str(path).lower() not in ("off", "none", "0"):
+            self.path = Path(path).expanduser()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+            self._db.commit()
+
+    # --- lookup / store ---
+    def get(self, text):
+        key = cache_key(self.model_name, text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return vector
+
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = array("f", row[0]).tolist()
+                    self._db.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    self._remember(key, vector)
+                    self.hits_disk += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, text, vector):
+        key = cache_key(self.model_name, text)
+        vector = [float(x) for x in vector]
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+                (key, self.model_name, array("f", vector).tobytes(), time.time()),
+            )
+            self._db.commit()
+            self._inserts += 1
+            if self._inserts % _EVICTION_CHECK_EVERY == 0:
+                self._evict()
+
+    def get_or_encode(self, texts, encode_fn):
+        """Return one vector per text; only cache misses are passed (as one batch) to encode_fn."""
+        vectors = [self.get(t) for t in texts]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            encoded = encode_fn([texts[i] for i in missing])
+            for i, vector in zip(missing, encoded):
+                vector = [float(x) for x in vector]
+                self.put(texts[i], vector)
+                vectors[i] = vector
+        return vectors
+
+    # --- housekeeping ---
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.lru_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        """Drop least-recently-used rows until the on-disk payload fits max_bytes."""
+        total = self._db.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in self._db.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._db.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+        self._db.commit()
+
+    def stats(self):
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        stats = {
+            "model": self.model_name,
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "path": str(self.path) if self.path else None,
+        }
+        if self._db is not None:
+            with self._lock:
+                entries, size = self._db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+                ).fetchone()
+            stats.update({"disk_entries": entries, "disk_bytes": size, "max_bytes": self.max_bytes})
+        return stats
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
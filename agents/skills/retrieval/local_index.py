@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Local Exact-Search Index
+Snapshot of a Qdrant collection as a memory-mapped embeddings matrix, searched
+with a vectorized dot product + argpartition (brute force, exact top-k).
+
+Serves as offline backend for rag_search.py (when Qdrant is down or slow) and as
+ground truth for measuring Qdrant's HNSW recall.
+
+On-disk layout (directory):
+    meta.json       collection, dim, count, dtype, point ids
+    vectors.bin     row-major float32/float16 matrix (L2-normalized rows)
+    vectors.i8      int8 matrix, only with --dtype int8 (scanned first)
+    scales.bin      float32 per-row dequantization scale for vectors.i8
+    payloads.jsonl  one payload per row
+    offsets.bin     uint64 byte offset of each payload line
+
+With --dtype int8 the scan runs over the int8 matrix and only the top
+`limit * oversampling` candidates are rescored against vectors.bin (float32),
+so the full-precision rows are paged in for the candidates only.
+
+Metadata filters (same format as rag_search.py) are applied before the scan:
+the matching rows are selected from the payloads, then only those are scored,
+so a filtered query still returns `limit` hits when enough rows match.
+
+Usage:
+    python3 local_index.py export [--dtype float16|int8] [--out <dir>]
+    python3 local_index.py recall [--k 10] [--queries <file>]
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from result_cache import bump_version
+
+DEFAULT_LOCAL_INDEX_PATH = os.getenv("RAG_LOCAL_INDEX", "~/.cache/easyway/wiki_vectors")
+
+# Rows upcast to float32 per block when the matrix is stored as float16/int8
+_BLOCK_ROWS = 65536
+
+# int8 first pass: candidates kept for full-precision rescoring = limit * oversampling
+DEFAULT_OVERSAMPLING = 4
+
+# Row selections kept per distinct filter (agents reuse a handful of filters)
+_FILTER_CACHE_SIZE = 64
+
+RANGE_OPERATORS = {
+    "gt": lambda value, bound: value > bound,
+    "gte": lambda value, bound: value >= bound,
+    "lt": lambda value, bound: value < bound,
+    "lte": lambda value, bound: value <= bound,
+}
+
+
+def payload_matches(payload, filters):
+    """Evaluate a metadata filter against one payload (same semantics as the Qdrant pushdown).
+
+    filters: {field: value}              equality (for list fields: value is one of the items)
+             {field: [v1, v2]}           any of the values
+             {field: {"gte": x, "lt": y}} range
+    Fields are AND-ed; a missing field never matches.
+    """
+    for field, condition in (filters or {}).items():
+        value = payload.get(field)
+        if value is None:
+            return False
+        values = value if isinstance(value, list) else [value]
+        if isinstance(condition, dict):
+            try:
+                if not any(all(RANGE_OPERATORS[op](v, b) for op, b in condition.items()) for v in values):
+                    return False
+            except TypeError:
+                return False
+        elif isinstance(condition, list):
+            if not any(v in condition for v in values):
+                return False
+        elif condition not in values:
+            return False
+    return True
+
+
+def quantize_int8(matrix):
+    """Symmetric per-row scalar quantization: row ~= int8_row * scale."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.maximum(np.abs(matrix).max(axis=1), 1e-12) / 127.0
+    quantized = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def blockwise_scores(queries, matrix, scales=None):
+    """queries (float32) @ matrix.T, upcasting `matrix` one block at a time."""
+    out = np.empty((queries.shape[0], matrix.shape[0]), dtype=np.float32)
+    for start in range(0, matrix.shape[0], _BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + _BLOCK_ROWS], dtype=np.float32)
+        out[:, start:start + block.shape[0]] = queries @ block.T
+    if scales is not None:
+        out *= scales[None, :]
+    return out
+
+
+def top_k(scores, k):
+    """Row-wise top-k indices of a score matrix, best first."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+class ExactIndex:
+    def __init__(self, vectors, ids, index_dir, quantized=None, scales=None):
+        self.vectors = vectors
+        self.ids = ids
+        self.index_dir = Path(index_dir)
+        self.quantized = quantized
+        self.scales = scales
+        self._offsets = np.fromfile(self.index_dir / "offsets.bin", dtype=np.uint64)
+        self._metadata = None   # payloads without "content", loaded on the first filtered query
+        self._filtered = {}     # filter JSON -> matching rows
+
+    @classmethod
+    def load(cls, index_dir=DEFAULT_LOCAL_INDEX_PATH):
+        src = Path(index_dir).expanduser()
+        with open(src / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        shape = (meta["count"], meta["dim"])
+        if meta["dtype"] == "int8":
+            vectors = np.memmap(src / "vectors.bin", dtype=np.float32, mode="r", shape=shape)
+            quantized = np.memmap(src / "vectors.i8", dtype=np.int8, mode="r", shape=shape)
+            scales = np.fromfile(src / "scales.bin", dtype=np.float32)
+            return cls(vectors, meta["ids"], src, quantized, scales)
+        vectors = np.memmap(src / "vectors.bin", dtype=meta["dtype"], mode="r", shape=shape)
+        return cls(vectors, meta["ids"], src)
+
+    @staticmethod
+    def exists(index_dir=DEFAULT_LOCAL_INDEX_PATH):
+        return (Path(index_dir).expanduser() / "meta.json").exists()
+
+    # --- query ---
+    @staticmethod
+    def _normalize(query_vectors):
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        return queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+    def scores(self, query_vectors):
+        """Cosine scores against the full-precision rows, shape (n_queries, n_rows)."""
+        queries = self._normalize(query_vectors)
+        if self.vectors.dtype == np.float32:
+            return queries @ self.vectors.T
+        return blockwise_scores(queries, self.vectors)
+
+    def search_many(self, query_vectors, limit=5, oversampling=DEFAULT_OVERSAMPLING, filters=None):
+        """Top-k per query: [[(row, score), ...], ...] best first.
+
+        Exact for float32/float16 snapshots; for int8 snapshots the int8 scan picks
+        limit * oversampling candidates which are rescored at full precision.
+        With `filters`, only rows whose payload matches are scanned.
+        """
+        rows = None if not filters else self.filter_rows(filters)
+        vectors, quantized = self.vectors, self.quantized
+        if rows is not None:
+            if rows.size == 0:
+                return [[] for _ in query_vectors]
+            vectors = vectors[rows]
+            quantized = None if quantized is None else quantized[rows]
+        row_of = (lambda i: int(i)) if rows is None else (lambda i: int(rows[i]))
+
+        queries = self._normalize(query_vectors)
+        if quantized is None:
+            scores = queries @ vectors.T if vectors.dtype == np.float32 else blockwise_scores(queries, vectors)
+            return [[(row_of(r), float(scores[q, r])) for r in top] for q, top in enumerate(top_k(scores, limit))]
+
+        scales = self.scales if rows is None else self.scales[rows]
+        approx = blockwise_scores(queries, quantized, scales)
+        candidates = top_k(approx, limit * oversampling)
+        results = []
+        for q, top in enumerate(candidates):
+            top = np.sort(top)  # sequential reads from the memmap
+            exact = np.asarray(vectors[top], dtype=np.float32) @ queries[q]
+            order = np.argsort(-exact)[:limit]
+            results.append([(row_of(top[i]), float(exact[i])) for i in order])
+        return results
+
+    def filter_rows(self, filters):
+        """Sorted row numbers whose payload matches `filters` (cached per filter)."""
+        key = json.dumps(filters, sort_keys=True, default=str)
+        rows = self._filtered.get(key)
+        if rows is None:
+            if self._metadata is None:
+                with open(self.index_dir / "payloads.jsonl", "rb") as f:
+                    self._metadata = [{k: v for k, v in json.loads(line).items() if k != "content"} for line in f]
+            rows = np.asarray([i for i, meta in enumerate(self._metadata) if payload_matches(meta, filters)],
+                              dtype=np.int64)
+            if len(self._filtered) >= _FILTER_CACHE_SIZE:
+                self._filtered.pop(next(iter(self._filtered)))
+            self._filtered[key] = rows
+        return rows
+
+    def search(self, query_vector, limit=5):
+        return self.search_many([query_vector], limit)[0]
+
+    def payload(self, row):
+        with open(self.index_dir / "payloads.jsonl", "rb") as f:
+            f.seek(int(self._offsets[row]))
+            return json.loads(f.readline())
+
+
+def export_collection(client, collection_name, out_dir=DEFAULT_LOCAL_INDEX_PATH, dtype="float32", batch_size=256):
+    """Scroll every point (vector + payload) out of Qdrant into the on-disk layout."""
+    out = Path(out_dir).expanduser()
+    out.mkdir(parents=True, exist_ok=True)
+    ids, offsets, dim, scales = [], [], None, []
+    quantize = dtype == "int8"
+    vector_dtype = "float32" if quantize else dtype
+
+    with open(out / "vectors.bin", "wb") as vec_file, open(out / "payloads.jsonl", "wb") as payload_file, \
+            open(out / "vectors.i8", "wb") if quantize else open(os.devnull, "wb") as i8_file:
+        next_offset = None
+        while True:
+            points, next_offset = client.scroll(
+                collection_name=collection_name,
+                limit=batch_size,
+                offset=next_offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            if not points:
+                break
+            block = np.asarray([p.vector for p in points], dtype=np.float32)
+            block /= np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+            dim = block.shape[1]
+            block.astype(vector_dtype).tofile(vec_file)
+            if quantize:
+                quantized, block_scales = quantize_int8(block)
+                quantized.tofile(i8_file)
+                scales.append(block_scales)
+            for p in points:
+                ids.append(str(p.id))
+                offsets.append(payload_file.tell())
+                payload_file.write(json.dumps(p.payload, ensure_ascii=False).encode("utf-8") + b"\n")
+            if next_offset is None:
+                break
+
+    np.asarray(offsets, dtype=np.uint64).tofile(out / "offsets.bin")
+    if quantize:
+        (np.concatenate(scales) if scales else np.empty(0, dtype=np.float32)).tofile(out / "scales.bin")
+    meta = {"collection": collection_name, "dim": dim or 0, "count": len(ids), "dtype": dtype, "ids": ids}
+    with open(out / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return meta
+
+
+def measure_recall(queries, k=10, index_dir=DEFAULT_LOCAL_INDEX_PATH):
+    """Recall@k of Qdrant (HNSW) against exact brute-force search on the exported snapshot."""
+    import rag_search
+
+    index = ExactIndex.load(index_dir)
+    client = rag_search.get_client()
+    query_vectors = rag_search.embed_queries(queries)
+
+    per_query = []
+    for query, vector, exact in zip(queries, query_vectors, index.search_many(query_vectors, k)):
+        truth = {index.ids[row] for row, _ in exact}
+        approx = client.query_points(collection_name=rag_search.COLLECTION_NAME, query=vector, limit=k).points
+        found = {str(p.id) for p in approx}
+        per_query.append({"query": query, "recall": len(truth & found) / max(len(truth), 1)})
+
+    return {
+        "k": k,
+        "queries": len(per_query),
+        "mean_recall": round(sum(q["recall"] for q in per_query) / max(len(per_query), 1), 4),
+        "per_query": per_query,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local exact-search snapshot of the Wiki collection")
+    parser.add_argument("command", choices=["export", "recall"])
+    parser.add_argument("--out", default=DEFAULT_LOCAL_INDEX_PATH)
+    parser.add_argument("--dtype", choices=["float32", "float16", "int8"], default="float32")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", help="File with one query per line")
+    args = parser.parse_args()
+
+    import rag_search
+
+    if args.command == "export":
+        started = time.perf_counter()
+        meta = export_collection(rag_search.get_client(), rag_search.COLLECTION_NAME, args.out, args.dtype)
+        bump_version("local_index.py")
+        print(json.dumps({
+            "status": "exported",
+            "index": str(Path(args.out).expanduser()),
+            "count": meta["count"],
+            "dim": meta["dim"],
+            "dtype": meta["dtype"],
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        }))
+        return
+
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = ["how do I deploy", "setup local environment", "qdrant api key", "rollback a failed release"]
+    print(json.dumps(measure_recall(queries, args.k, args.out)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,742 @@
-
 import os
 import sys
 import json
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
+import time
+import argparse
+import threading
+import socketserver
+from embedder import get_embedder, cache_namespace, DEFAULT_BACKEND as EMBEDDER_BACKEND
+from embedding_cache import EmbeddingCache
+from result_cache import ResultCache
+from local_index import ExactIndex, DEFAULT_LOCAL_INDEX_PATH, RANGE_OPERATORS, payload_matches
+from bm25_index import BM25Index, DEFAULT_INDEX_PATH as BM25_INDEX_PATH, doc_key, tokenize
 
 # Configuration
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", None)
+QDRANT_PATH = os.getenv("QDRANT_PATH")  # embedded (on-disk) Qdrant instead of the server
 COLLECTION_NAME = "easyway_wiki"
+MODEL_NAME = "all-MiniLM-L6-v2"
 
-def search(query, limit=5):
-    try:
-        # 1. Connect to Qdrant
+# Retrieval backend: "qdrant", "local" (memory-mapped exact search, see local_index.py)
+# or "auto" (Qdrant, falling back to the local snapshot when Qdrant fails)
+RAG_BACKEND = os.getenv("RAG_BACKEND", "auto")
+
+# Scalar (int8) quantization: Qdrant scans the int8 copy, then rescores
+# limit * oversampling candidates with the original float32 vectors.
+# Ignored by Qdrant on collections without a quantization config.
+QUANTIZATION_OVERSAMPLING = float(os.getenv("RAG_QUANTIZATION_OVERSAMPLING", 2.0))
+
+# Resident mode: the server listens on loopback only
+RAG_SERVER_HOST = os.getenv("RAG_SEARCH_HOST", "127.0.0.1")
+RAG_SERVER_PORT = int(os.getenv("RAG_SEARCH_PORT", 8765))
+
+# Payload indexes created on the Wiki collection (ingest_wiki.js creates the same set):
+# filtered queries on these fields use the index instead of scanning payloads
+PAYLOAD_INDEXES = {
+    "section": "keyword",
+    "domain": "keyword",
+    "type": "keyword",
+    "tags": "keyword",
+    "filename": "keyword",
+    "chunk_index": "integer",
+}
+
+# Hybrid retrieval: reciprocal-rank fusion constant and candidates taken from each ranker
+RRF_K = 60
+HYBRID_CANDIDATES = 20
+# Points per scroll page when resolving BM25-only hits to point ids
+RESOLVE_PAGE_SIZE = 256
+
+# Snippet mode: default character budget per hit (full content via fetch())
+DEFAULT_SNIPPET_CHARS = 300
+
+# Loaded once per process and reused by every query (see --serve / --stdio).
+# qdrant_client, sentence_transformers and onnxruntime are imported on first use only,
+# so cache hits, local-snapshot queries and --cache-stats start without them
+# (startup cost per subcommand: bench_startup.py).
+_client = None
+_search_params = None
+_model = None
+_cache = None
+_bm25 = None
+_local = None
+_results = None
+_encode_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is not None:
+        return _client
+    from qdrant_client import QdrantClient
+    if QDRANT_PATH:
+        _client = QdrantClient(path=QDRANT_PATH)
+    else:
         # Force HTTP to avoid SSL errors internal to the cluster
         url = f"http://{QDRANT_HOST}:{QDRANT_PORT}"
-        client = QdrantClient(url=url, api_key=QDRANT_API_KEY)
+        _client = QdrantClient(url=url, api_key=QDRANT_API_KEY)
+    return _client
 
-        # 2. Load Model & Embed Query
-        # matching the Node.js ingestion model
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        query_vector = model.encode(query).tolist()
 
-        # 3. Search
+def get_search_params():
+    global _search_params
+    if _search_params is None:
+        from qdrant_client import models
+        _search_params = models.SearchParams(
+            quantization=models.QuantizationSearchParams(rescore=True, oversampling=QUANTIZATION_OVERSAMPLING)
+        )
+    return _search_params
+
+
+def get_model():
+    global _model
+    if _model is None:
+        # matching the Node.js ingestion model; torch or ONNX Runtime (RAG_EMBEDDER, see embedder.py)
+        _model = get_embedder(MODEL_NAME, EMBEDDER_BACKEND)
+    return _model
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache(cache_namespace(MODEL_NAME, EMBEDDER_BACKEND))
+    return _cache
+
+
+def get_bm25():
+    """BM25 index built by `bm25_index.py build`; None when it has not been built yet."""
+    global _bm25
+    if _bm25 is None and os.path.exists(os.path.join(os.path.expanduser(BM25_INDEX_PATH), "meta.json")):
+        _bm25 = BM25Index.load(BM25_INDEX_PATH)
+    return _bm25
+
+
+def get_local_index():
+    """Exact-search snapshot exported by `local_index.py export`; None if missing."""
+    global _local
+    if _local is None and ExactIndex.exists(DEFAULT_LOCAL_INDEX_PATH):
+        _local = ExactIndex.load(DEFAULT_LOCAL_INDEX_PATH)
+    return _local
+
+
+def get_result_cache():
+    global _results
+    if _results is None:
+        _results = ResultCache(on_invalidate=reset_indexes)
+    return _results
+
+
+def reset_indexes():
+    """Drop the in-process BM25/local snapshots so a re-index is picked up on next use."""
+    global _bm25, _local
+    _bm25 = None
+    _local = None
+
+
+def embed_queries(queries):
+    """Embed queries, going to the encoder only for cache misses."""
+    def encode(texts):
+        with _encode_lock:
+            return get_model().encode(texts).tolist()
+    return get_cache().get_or_encode(queries, encode)
+
+
+def validate_filters(filters):
+    """Metadata filter format shared by every backend; raises ValueError on anything else.
+
+    {"domain": "security"}                equality (list fields such as tags: one of the items)
+    {"section": ["Runbooks", "guides"]}   any of the values
+    {"chunk_index": {"gte": 0, "lt": 3}}  range (gt/gte/lt/lte)
+    Fields are AND-ed.
+    """
+    if not filters:
+        return
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object of field -> condition")
+    for field, condition in filters.items():
+        if isinstance(condition, dict):
+            unknown = set(condition) - set(RANGE_OPERATORS)
+            if unknown or not condition:
+                raise ValueError(f"Unsupported range operator(s) for '{field}': {', '.join(sorted(unknown)) or 'none'}")
+        elif not isinstance(condition, (list, str, int, bool)):
+            raise ValueError(f"Unsupported filter value for '{field}': {condition!r}")
+
+
+def to_qdrant_filter(filters):
+    """Metadata filter -> Qdrant payload filter (None when there is nothing to filter on)."""
+    if not filters:
+        return None
+    validate_filters(filters)
+    from qdrant_client import models
+    must = []
+    for field, condition in filters.items():
+        if isinstance(condition, dict):
+            must.append(models.FieldCondition(key=field, range=models.Range(**condition)))
+        elif isinstance(condition, list):
+            must.append(models.FieldCondition(key=field, match=models.MatchAny(any=condition)))
+        else:
+            must.append(models.FieldCondition(key=field, match=models.MatchValue(value=condition)))
+    return models.Filter(must=must)
+
+
+def search(query, limit=5, backend=None, filters=None):
+    backend = backend or RAG_BACKEND
+    try:
+        validate_filters(filters)
+        # 1. Embed Query (cached by model + normalized text)
+        query_vector = embed_queries([query])[0]
+    except Exception as e:
+        return {"error": str(e)}
+
+    # Same embedding + parameters + filters on the same collection version -> same answer
+    cache = get_result_cache()
+    key = cache.key(query_vector, limit, backend=backend, collection=COLLECTION_NAME, filters=filters or None)
+    cached, version = cache.lookup(key)
+    if cached is not None:
+        return cached
+
+    response = search_vector(query_vector, limit, backend, filters)
+    if "error" not in response and "warning" not in response:
+        cache.put(key, response, version)
+    return response
+
+
+def search_vector(query_vector, limit=5, backend=None, filters=None):
+    if backend == "local":
+        return search_local([query_vector], limit, filters)[0]
+
+    response = search_qdrant(query_vector, limit, filters)
+    if "error" in response and backend == "auto" and get_local_index() is not None:
+        fallback = search_local([query_vector], limit, filters)[0]
+        fallback["warning"] = f"Qdrant unavailable ({response['error']}), served from local snapshot"
+        return fallback
+    return response
+
+
+def search_local(query_vectors, limit=5, filters=None):
+    """Exact top-k against the memory-mapped snapshot, one response per query vector."""
+    index = get_local_index()
+    if index is None:
+        return [{"error": f"Local index not found at {DEFAULT_LOCAL_INDEX_PATH}"} for _ in query_vectors]
+
+    responses = []
+    for hits in index.search_many(query_vectors, limit, filters=filters):
+        results = []
+        for row, score in hits:
+            payload = index.payload(row)
+            results.append({
+                "id": index.ids[row],
+                "filename": payload.get("filename"),
+                "content": payload.get("content"),
+                "score": score,
+                "path": payload.get("path"),
+                "chunk_index": payload.get("chunk_index")
+            })
+        responses.append({"results": results, "backend": "local"})
+    return responses
+
+
+def search_qdrant(query_vector, limit=5, filters=None):
+    try:
+        # 2. Connect to Qdrant
+        client = get_client()
+
         # 3. Search
         # client.search was removed/missing, using query_points
         search_result = client.query_points(
             collection_name=COLLECTION_NAME,
             query=query_vector,
-            limit=limit
+            query_filter=to_qdrant_filter(filters),
+            limit=limit,
+            search_params=get_search_params()
         )
         hits = search_result.points
 
         # 4. Format Results
-        results = []
-        for hit in hits:
-            results.append({
-                "filename": hit.payload.get("filename"),
-                "content": hit.payload.get("content"),
-                "score": hit.score,
-                "path": hit.payload.get("path")
-            })
+        return {"results": format_hits(hits)}
+
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def search_batch(queries, limit=5, backend=None, filters=None):
+    """Run many queries with one encode call and one Qdrant round-trip; results grouped per query."""
+    backend = backend or RAG_BACKEND
+    try:
+        if not queries:
+            return {"results": []}
+
+        validate_filters(filters)
+        query_vectors = embed_queries(queries)
+    except Exception as e:
+        return {"error": str(e)}
+
+    # Only queries without a cached answer go to the backend
+    cache = get_result_cache()
+    keys = [cache.key(v, limit, backend=backend, collection=COLLECTION_NAME, filters=filters or None)
+            for v in query_vectors]
+    looked_up = [cache.lookup(k) for k in keys]
+    cached = [response for response, _ in looked_up]
+    version = looked_up[0][1]  # earliest version seen: a re-index during the lookups drops the puts
+    missing = [i for i, c in enumerate(cached) if c is None]
+
+    output = {}
+    if missing:
+        response = search_batch_vector(
+            [queries[i] for i in missing], [query_vectors[i] for i in missing], limit, backend, filters
+        )
+        if "error" in response:
+            return response
+        for i, entry in zip(missing, response["results"]):
+            cached[i] = {"results": entry["results"]}
+            if "warning" not in response:
+                cache.put(keys[i], cached[i], version)
+        output = {k: v for k, v in response.items() if k != "results"}
+
+    output["results"] = [{"query": q, "results": c["results"]} for q, c in zip(queries, cached)]
+    return output
+
+
+def search_batch_vector(queries, query_vectors, limit=5, backend=None, filters=None):
+    if backend == "local":
+        return group_local(queries, search_local(query_vectors, limit, filters))
+
+    response = search_batch_qdrant(queries, query_vectors, limit, filters)
+    if "error" in response and backend == "auto" and get_local_index() is not None:
+        fallback = group_local(queries, search_local(query_vectors, limit, filters))
+        fallback["warning"] = f"Qdrant unavailable ({response['error']}), served from local snapshot"
+        return fallback
+    return response
+
+
+def group_local(queries, responses):
+    return {
+        "results": [{"query": query, "results": r.get("results", [])} for query, r in zip(queries, responses)],
+        "backend": "local"
+    }
+
+
+def search_batch_qdrant(queries, query_vectors, limit=5, filters=None):
+    try:
+        from qdrant_client import models
+        client = get_client()
+        query_filter = to_qdrant_filter(filters)
+
+        responses = client.query_batch_points(
+            collection_name=COLLECTION_NAME,
+            requests=[
+                models.QueryRequest(query=vector, filter=query_filter, limit=limit, with_payload=True,
+                                    params=get_search_params())
+                for vector in query_vectors
+            ]
+        )
+
+        return {"results": [
+            {"query": query, "results": format_hits(response.points)}
+            for query, response in zip(queries, responses)
+        ]}
+
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def hybrid_search(query, limit=5, backend=None, filters=None):
+    """BM25 + vector search over the Wiki, merged with reciprocal-rank fusion.
+
+    With filters, BM25 candidates are kept only when their page metadata (same
+    fields ingest_wiki.js stores in the payload) matches.
+    """
+    try:
+        candidates = max(limit, HYBRID_CANDIDATES)
+        vector = search(query, candidates, backend, filters)
+        if "error" in vector:
+            return vector
+
+        bm25 = get_bm25()
+        if bm25 is None:
+            vector["results"] = vector["results"][:limit]
+            vector["warning"] = f"BM25 index not found at {BM25_INDEX_PATH}, vector-only results"
+            return vector
+
+        fused = {}
+        for rank, hit in enumerate(vector["results"]):
+            key = doc_key(hit["path"], hit.get("chunk_index"))
+            entry = fused.setdefault(key, {"hit": hit, "rrf": 0.0})
+            entry["rrf"] += 1.0 / (RRF_K + rank + 1)
+            entry["hit"]["vector_score"] = hit["score"]
+
+        if filters:
+            matching = (h for h in bm25.search(query, len(bm25.chunks))
+                        if payload_matches(bm25.chunk_metadata(h[0]), filters))
+            bm25_hits = [h for _, h in zip(range(candidates), matching)]
+        else:
+            bm25_hits = bm25.search(query, candidates)
+        for rank, (chunk_id, score) in enumerate(bm25_hits):
+            key = bm25.chunk_key(chunk_id)
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = {"hit": None, "rrf": 0.0, "chunk_id": chunk_id}
+            entry["rrf"] += 1.0 / (RRF_K + rank + 1)
+            entry["bm25_score"] = score
+
+        ranked = sorted(fused.values(), key=lambda e: e["rrf"], reverse=True)[:limit]
+        results, bm25_only = [], []
+        for entry in ranked:
+            # BM25-only hits are materialized from the Wiki file (only for the final top-k)
+            hit = entry["hit"]
+            if hit is None:
+                hit = bm25.chunk_hit(entry["chunk_id"], entry["bm25_score"])
+                bm25_only.append(hit)
+            if "bm25_score" in entry:
+                hit["bm25_score"] = entry["bm25_score"]
+            hit["score"] = entry["rrf"]
+            results.append(hit)
+        resolve_point_ids(bm25_only, backend)
 
         return {"results": results}
 
     except Exception as e:
         return {"error": str(e)}
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
+
+def resolve_point_ids(hits, backend=None):
+    """Fill in `id` of BM25-only hybrid hits so fetch() works on them.
+
+    Lookup on the indexed filename/chunk_index fields for all hits, matched back by doc_key
+    (the stored `path` depends on where ingest_wiki.js ran). Common filenames (index.md) match
+    chunks of many pages, so Qdrant is paged until every hit is resolved or the filter is exhausted.
+    Hits not in the collection keep id None.
+    """
+    if not hits:
+        return
+    backend = backend or RAG_BACKEND
+    wanted = {doc_key(hit["path"], hit["chunk_index"]): hit for hit in hits}
+    filters = {
+        "filename": sorted({hit["filename"] for hit in hits}),
+        "chunk_index": sorted({hit["chunk_index"] for hit in hits}),
+    }
+
+    def assign(point_id, payload):
+        hit = wanted.pop(doc_key(payload.get("path"), payload.get("chunk_index")), None)
+        if hit is not None:
+            hit["id"] = point_id
+
+    if backend != "local":
+        try:
+            client, offset = get_client(), None
+            query_filter = to_qdrant_filter(filters)
+            while wanted:
+                records, offset = client.scroll(
+                    collection_name=COLLECTION_NAME,
+                    scroll_filter=query_filter,
+                    limit=RESOLVE_PAGE_SIZE,
+                    offset=offset,
+                    with_payload=["path", "chunk_index"]
+                )
+                for record in records:
+                    assign(str(record.id), record.payload)
+                if offset is None:
+                    break
+            return
+        except Exception:
+            if backend == "qdrant" or get_local_index() is None:
+                return
+
+    index = get_local_index()
+    if index is None:
+        return
+    for row in index.filter_rows(filters):
+        assign(index.ids[row], index.payload(row))
+
+
+def format_hits(hits):
+    results = []
+    for hit in hits:
+        results.append({
+            "id": str(hit.id),
+            "filename": hit.payload.get("filename"),
+            "content": hit.payload.get("content"),
+            "score": hit.score,
+            "path": hit.payload.get("path"),
+            "chunk_index": hit.payload.get("chunk_index")
+        })
+    return results
+
+
+def make_snippet(content, query, budget=DEFAULT_SNIPPET_CHARS):
+    """Window of `budget` chars of content holding the most query terms, cut on word boundaries."""
+    if not content or len(content) <= budget:
+        return content
+    terms = set(tokenize(query))
+    lowered = content.lower()
+
+    # Candidate windows start at line starts; score = distinct query terms inside the window,
+    # ties go to the window whose first line already matches
+    best_start, best_score = 0, (-1, False)
+    for start in [0] + [i + 1 for i, ch in enumerate(content) if ch == "\n"]:
+        window = lowered[start:start + budget]
+        first_line = window.split("\n", 1)[0]
+        score = (len(terms & set(tokenize(window))), bool(terms & set(tokenize(first_line))))
+        if score > best_score:
+            best_start, best_score = start, score
+
+    end = min(len(content), best_start + budget)
+    if end < len(content) and " " in content[best_start:end]:
+        end = content.rindex(" ", best_start, end)
+    snippet = content[best_start:end].strip()
+    return ("…" if best_start > 0 else "") + snippet + ("…" if end < len(content) else "")
+
+
+def apply_snippets(response, query, budget=DEFAULT_SNIPPET_CHARS):
+    """Replace full `content` with a query-focused `snippet` in every hit (single or batch response)."""
+    for entry in response.get("results", []):
+        if "results" in entry:  # batch response: {"query", "results"}
+            apply_snippets(entry, entry["query"], budget)
+            continue
+        entry["snippet"] = make_snippet(entry.pop("content", None), query, budget)
+    return response
+
+
+def fetch(ids, backend=None):
+    """Full payload for point ids returned by a snippet-mode search."""
+    backend = backend or RAG_BACKEND
+    if backend != "local":
+        try:
+            points = get_client().retrieve(collection_name=COLLECTION_NAME, ids=ids, with_payload=True)
+            return {"results": [dict(p.payload, id=str(p.id)) for p in points]}
+        except Exception as e:
+            if backend == "qdrant" or get_local_index() is None:
+                return {"error": str(e)}
+
+    index = get_local_index()
+    if index is None:
+        return {"error": f"Local index not found at {DEFAULT_LOCAL_INDEX_PATH}"}
+    rows = {point_id: row for row, point_id in enumerate(index.ids)}
+    return {
+        "results": [dict(index.payload(rows[i]), id=i) for i in ids if i in rows],
+        "backend": "local"
+    }
+
+
+def enable_quantization():
+    """Add int8 scalar quantization to the Wiki collection (original vectors are kept for rescoring)."""
+    try:
+        from qdrant_client import models
+        get_client().update_collection(
+            collection_name=COLLECTION_NAME,
+            quantization_config=models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        )
+        return {"status": "quantization_enabled", "collection": COLLECTION_NAME, "type": "int8"}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def create_payload_indexes():
+    """Payload indexes on the filterable fields, for collections ingested before they existed."""
+    try:
+        from qdrant_client import models
+        client = get_client()
+        for field, schema in PAYLOAD_INDEXES.items():
+            client.create_payload_index(collection_name=COLLECTION_NAME, field_name=field,
+                                        field_schema=models.PayloadSchemaType(schema), wait=True)
+        return {"status": "payload_indexes_created", "collection": COLLECTION_NAME, "fields": list(PAYLOAD_INDEXES)}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def parse_filter_args(pairs, raw=None):
+    """CLI filters: --filters JSON, then each --filter FIELD=VALUE (a,b = any of; integers stay integers)."""
+    filters = json.loads(raw) if raw else {}
+    for pair in pairs or []:
+        field, sep, value = pair.partition("=")
+        if not sep or not field:
+            raise ValueError(f"Invalid --filter '{pair}' (expected FIELD=VALUE)")
+        values = [int(v) if v.lstrip("-").isdigit() else v for v in value.split(",")]
+        filters[field] = values if len(values) > 1 else values[0]
+    return filters
+
+
+def handle_request(line):
+    """Answer one JSON-lines request.
+
+    {"query": "...", "limit": 5, "mode": "vector|hybrid", "snippet_chars": 300, "filters": {"domain": "security"}}
+    {"queries": [...], "limit": 5, "filters": {...}}
+    {"op": "fetch", "ids": [...]} / {"op": "stats"} / {"op": "ping"}
+    """
+    try:
+        request = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {"error": f"Invalid JSON request: {e}"}
+    if not isinstance(request, dict):
+        return {"error": "Request must be a JSON object"}
+
+    # One bad request must not take down the resident server shared by every agent
+    try:
+        return answer_request(request)
+    except Exception as e:
+        response = {"error": str(e)}
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+
+def answer_request(request):
+    if request.get("op") == "ping":
+        return {"status": "ok", "pid": os.getpid()}
+    if request.get("op") == "stats":
+        return {"embedding_cache": get_cache().stats(), "result_cache": get_result_cache().stats()}
+    if request.get("op") == "fetch":
+        return fetch(request.get("ids", []), request.get("backend"))
+
+    queries = request.get("queries")
+    query = request.get("query")
+    if not query and not queries:
+        return {"error": "No query provided"}
+
+    started = time.perf_counter()
+    limit = int(request.get("limit", 5))
+    backend = request.get("backend")
+    filters = request.get("filters")
+    if queries:
+        response = search_batch(queries, limit, backend, filters)
+    elif request.get("mode") == "hybrid":
+        response = hybrid_search(query, limit, backend, filters)
+    else:
+        response = search(query, limit, backend, filters)
+    if request.get("snippet_chars"):
+        apply_snippets(response, query, int(request["snippet_chars"]))
+    response["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    if "id" in request:
+        response["id"] = request["id"]
+    return response
+
+
+def warm_up():
+    """Load model and client before accepting the first query."""
+    started = time.perf_counter()
+    get_client()
+    get_model().encode("warm-up")
+    get_bm25()
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def serve_stdio():
+    """Resident mode over stdin/stdout: one JSON request per line, one JSON response per line."""
+    warmup_ms = warm_up()
+    print(json.dumps({"status": "ready", "warmup_ms": warmup_ms}), flush=True)
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        print(json.dumps(handle_request(line)), flush=True)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode("utf-8").strip()
+            if not line:
+                continue
+            payload = json.dumps(handle_request(line)) + "\n"
+            self.wfile.write(payload.encode("utf-8"))
+            self.wfile.flush()
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve_socket(host=RAG_SERVER_HOST, port=RAG_SERVER_PORT):
+    """Resident mode over a loopback TCP socket (JSON-lines, same protocol as --stdio)."""
+    warmup_ms = warm_up()
+    with _ThreadingServer((host, port), _RequestHandler) as server:
+        print(json.dumps({"status": "listening", "host": host, "port": port, "warmup_ms": warmup_ms}), flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EasyWay Wiki RAG search (Qdrant)")
+    parser.add_argument("query", nargs="*", help="Query text (one-shot mode)")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--stdio", action="store_true", help="Resident mode: JSON-lines over stdin/stdout")
+    parser.add_argument("--serve", action="store_true", help="Resident mode: JSON-lines over a loopback TCP socket")
+    parser.add_argument("--host", default=RAG_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=RAG_SERVER_PORT)
+    parser.add_argument("--backend", choices=["qdrant", "local", "auto"], default=RAG_BACKEND)
+    parser.add_argument("--hybrid", action="store_true", help="BM25 + vector retrieval fused with RRF")
+    parser.add_argument("--snippets", type=int, nargs="?", const=DEFAULT_SNIPPET_CHARS, default=0, metavar="CHARS",
+                        help="Return id/score/path + a query-focused snippet instead of full content")
+    parser.add_argument("--fetch", nargs="+", metavar="ID", help="Fetch full content for point ids")
+    parser.add_argument("--batch", action="store_true", help="Read a JSON array of queries from stdin")
+    parser.add_argument("--cache-stats", action="store_true", help="Print embedding cache counters and exit")
+    parser.add_argument("--enable-quantization", action="store_true", help="Enable int8 scalar quantization on the collection")
+    parser.add_argument("--create-payload-indexes", action="store_true",
+                        help="Create payload indexes on the filterable fields of the collection")
+    parser.add_argument("--filter", action="append", metavar="FIELD=VALUE",
+                        help="Metadata filter, repeatable (e.g. domain=security, section=Runbooks,guides)")
+    parser.add_argument("--filters", metavar="JSON", help='Metadata filter object, e.g. \'{"chunk_index": {"lt": 3}}\'')
+    args = parser.parse_args()
+
+    if args.enable_quantization:
+        print(json.dumps(enable_quantization()))
+        return
+
+    if args.create_payload_indexes:
+        print(json.dumps(create_payload_indexes()))
+        return
+
+    try:
+        filters = parse_filter_args(args.filter, args.filters)
+    except ValueError as e:  # includes JSONDecodeError
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+    if args.cache_stats:
+        print(json.dumps({"embedding_cache": get_cache().stats(), "result_cache": get_result_cache().stats()}))
+        return
+
+    if args.fetch:
+        print(json.dumps(fetch(args.fetch, args.backend)))
+        return
+
+    if args.batch:
+        queries = json.load(sys.stdin)
+        if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+            print(json.dumps({"error": "Batch input must be a JSON array of strings"}))
+            sys.exit(1)
+        response = search_batch(queries, args.limit, args.backend, filters)
+        if args.snippets:
+            apply_snippets(response, None, args.snippets)
+        print(json.dumps(response))
+        return
+
+    if args.stdio:
+        serve_stdio()
+        return
+    if args.serve:
+        serve_socket(args.host, args.port)
+        return
+
+    if not args.query:
         print(json.dumps({"error": "No query provided"}))
         sys.exit(1)
 
-    query_text = sys.argv[1]
-    response = search(query_text)
+    query_text = " ".join(args.query)
+    if args.hybrid:
+        response = hybrid_search(query_text, args.limit, args.backend, filters)
+    else:
+        response = search(query_text, args.limit, args.backend, filters)
+    if args.snippets:
+        apply_snippets(response, query_text, args.snippets)
     print(json.dumps(response))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Async RAG Search
+asyncio front-end for rag_search.py built on AsyncQdrantClient, so one process
+can serve many agents concurrently:
+
+- at most `max_in_flight` Qdrant requests run at the same time (semaphore)
+- identical queries arriving together share one in-flight search (coalescing)
+- queries arriving within `batch_window_ms` are embedded in one encode call
+
+Model, embedding cache, result cache and local fallback are the ones from
+rag_search.py; only the Qdrant round-trip is async.
+
+Usage:
+    python3 rag_search_async.py --serve [--port 8766] [--max-in-flight 16]
+    python3 rag_search_async.py "query one" "query two"
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import os
+import time
+
+import rag_search
+from embedding_cache import normalize_text
+
+DEFAULT_MAX_IN_FLIGHT = int(os.getenv("RAG_ASYNC_MAX_IN_FLIGHT", 16))
+DEFAULT_BATCH_WINDOW_MS = float(os.getenv("RAG_ASYNC_BATCH_WINDOW_MS", 2))
+DEFAULT_ASYNC_PORT = int(os.getenv("RAG_SEARCH_ASYNC_PORT", 8766))
+
+
+class AsyncRetriever:
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, batch_window_ms=DEFAULT_BATCH_WINDOW_MS):
+        self.max_in_flight = max_in_flight
+        self.batch_window_s = batch_window_ms / 1000.0
+        self._client = None
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._in_flight = {}        # (normalized query, limit, backend) -> Future
+        self._pending_embeds = []   # [(query, Future)] waiting for the next encode batch
+        self._embed_task = None
+        self.coalesced = 0
+        self.encode_batches = 0
+
+    def get_client(self):
+        if self._client is None:
+            from qdrant_client import AsyncQdrantClient  # imported on first Qdrant query (see rag_search.py)
+            if rag_search.QDRANT_PATH:
+                self._client = AsyncQdrantClient(path=rag_search.QDRANT_PATH)
+            else:
+                url = f"http://{rag_search.QDRANT_HOST}:{rag_search.QDRANT_PORT}"
+                self._client = AsyncQdrantClient(url=url, api_key=rag_search.QDRANT_API_KEY)
+        return self._client
+
+    # --- embedding: micro-batched, encoder runs in a worker thread ---
+    async def embed(self, query):
+        future = asyncio.get_running_loop().create_future()
+        self._pending_embeds.append((query, future))
+        if self._embed_task is None:
+            self._embed_task = asyncio.create_task(self._flush_embeds())
+        return await future
+
+    async def _flush_embeds(self):
+        await asyncio.sleep(self.batch_window_s)
+        batch, self._pending_embeds, self._embed_task = self._pending_embeds, [], None
+        self.encode_batches += 1
+        try:
+            vectors = await asyncio.to_thread(rag_search.embed_queries, [q for q, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    # --- search ---
+    async def search(self, query, limit=5, backend=None, filters=None):
+        backend = backend or rag_search.RAG_BACKEND
+        key = (normalize_text(query), limit, backend, json.dumps(filters or None, sort_keys=True))
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                response = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # this caller was cancelled, not the search it was waiting on
+                return {"error": "Search cancelled before it completed"}
+            # Each caller gets its own copy (snippet mode, elapsed_ms and id rewrite it in place)
+            return copy.deepcopy(response)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        response = None
+        try:
+            response = await self._search(query, limit, backend, filters)
+        except Exception as e:
+            response = {"error": str(e)}
+        except BaseException as e:
+            # Leader cancelled (client gone, shutdown) or interrupted: followers must not wait forever
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+            raise
+        finally:
+            del self._in_flight[key]
+            # The future keeps the pristine response: followers copy it after the leader returned
+            if not future.done():
+                future.set_result(response)
+        return copy.deepcopy(response)
+
+    async def _search(self, query, limit, backend, filters=None):
+        rag_search.validate_filters(filters)
+        query_vector = await self.embed(query)
+
+        cache = rag_search.get_result_cache()
+        key = cache.key(query_vector, limit, backend=backend, collection=rag_search.COLLECTION_NAME,
+                        filters=filters or None)
+        cached, version = cache.lookup(key)
+        if cached is not None:
+            return cached
+
+        if backend == "local":
+            return await asyncio.to_thread(rag_search.search_vector, query_vector, limit, backend, filters)
+
+        try:
+            async with self._semaphore:
+                result = await self.get_client().query_points(
+                    collection_name=rag_search.COLLECTION_NAME,
+                    query=query_vector,
+                    query_filter=rag_search.to_qdrant_filter(filters),
+                    limit=limit,
+                    search_params=rag_search.get_search_params()
+                )
+            response = {"results": rag_search.format_hits(result.points)}
+        except Exception as e:
+            if backend != "auto" or rag_search.get_local_index() is None:
+                return {"error": str(e)}
+            response = (await asyncio.to_thread(rag_search.search_local, [query_vector], limit, filters))[0]
+            response["warning"] = f"Qdrant unavailable ({e}), served from local snapshot"
+            return response
+
+        cache.put(key, response, version)
+        return response
+
+    async def search_many(self, queries, limit=5, backend=None, filters=None):
+        responses = await asyncio.gather(*(self.search(q, limit, backend, filters) for q in queries))
+        grouped = []
+        for query, response in zip(queries, responses):
+            entry = {"query": query, "results": response.get("results", [])}
+            if "error" in response:
+                entry["error"] = response["error"]
+            grouped.append(entry)
+        return {"results": grouped}
+
+    def stats(self):
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": len(self._in_flight),
+            "coalesced": self.coalesced,
+            "encode_batches": self.encode_batches,
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+
+
+async def handle_request(retriever, line):
+    """Same JSON-lines protocol as rag_search.py (query/queries, limit, filters, snippet_chars, op)."""
+    try:
+        request = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {"error": f"Invalid JSON request: {e}"}
+    if not isinstance(request, dict):
+        return {"error": "Request must be a JSON object"}
+
+    # Every request gets a response line: a failing one must not leave its client waiting
+    try:
+        return await answer_request(retriever, request)
+    except Exception as e:
+        response = {"error": str(e)}
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+
+async def answer_request(retriever, request):
+    if request.get("op") == "ping":
+        return {"status": "ok", "pid": os.getpid()}
+    if request.get("op") == "stats":
+        return {"async": retriever.stats(), "embedding_cache": rag_search.get_cache().stats(),
+                "result_cache": rag_search.get_result_cache().stats()}
+
+    query, queries = request.get("query"), request.get("queries")
+    if not query and not queries:
+        return {"error": "No query provided"}
+
+    started = time.perf_counter()
+    limit, backend, filters = int(request.get("limit", 5)), request.get("backend"), request.get("filters")
+    if queries:
+        response = await retriever.search_many(queries, limit, backend, filters)
+    else:
+        response = await retriever.search(query, limit, backend, filters)
+    if request.get("snippet_chars"):
+        rag_search.apply_snippets(response, query, int(request["snippet_chars"]))
+    response["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    if "id" in request:
+        response["id"] = request["id"]
+    return response
+
+
+async def serve(host, port, max_in_flight):
+    retriever = AsyncRetriever(max_in_flight)
+    started = time.perf_counter()
+    await asyncio.to_thread(lambda: rag_search.get_model().encode("warm-up"))
+    warmup_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    async def on_connection(reader, writer):
+        # Requests on one connection are answered concurrently; clients match them by "id"
+        write_lock = asyncio.Lock()
+
+        async def answer(line):
+            response = await handle_request(retriever, line)
+            async with write_lock:
+                writer.write((json.dumps(response) + "\n").encode("utf-8"))
+                await writer.drain()
+
+        tasks = set()
+        while line := await reader.readline():
+            if line.strip():
+                task = asyncio.create_task(answer(line.decode("utf-8")))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        writer.close()
+
+    server = await asyncio.start_server(on_connection, host, port)
+    print(json.dumps({"status": "listening", "host": host, "port": port, "warmup_ms": warmup_ms,
+                      "max_in_flight": max_in_flight}), flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+async def run_once(queries, limit, max_in_flight):
+    retriever = AsyncRetriever(max_in_flight)
+    try:
+        if len(queries) == 1:
+            return await retriever.search(queries[0], limit)
+        return await retriever.search_many(queries, limit)
+    finally:
+        await retriever.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async EasyWay Wiki RAG search (Qdrant)")
+    parser.add_argument("query", nargs="*", help="One or more queries, searched concurrently")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--serve", action="store_true", help="JSON-lines server on a loopback TCP socket")
+    parser.add_argument("--host", default=rag_search.RAG_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_ASYNC_PORT)
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT)
+    args = parser.parse_args()
+
+    if args.serve:
+        try:
+            asyncio.run(serve(args.host, args.port, args.max_in_flight))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if not args.query:
+        print(json.dumps({"error": "No query provided"}))
+        raise SystemExit(1)
+
+    print(json.dumps(asyncio.run(run_once(args.query, args.limit, args.max_in_flight))))
+
+
+if __name__ == "__main__":
+    main()
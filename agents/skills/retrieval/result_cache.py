@@ -0,0 +1,119 @@
+"""
+Versioned Result Cache
+In-process LRU + TTL cache of rag_search responses, keyed by query embedding,
+limit and search parameters (backend, filters, ...).
+
+Every entry belongs to a collection version. Ingestion bumps the version marker
+file (ingest_wiki.js, bm25_index.py build, local_index.py export); the cache
+stats the marker on each lookup and drops everything when it changes, so a
+re-index is never answered from stale results.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_VERSION_FILE = os.getenv("RAG_INDEX_VERSION_FILE", "~/.cache/easyway/easyway_wiki.version")
+DEFAULT_TTL_S = float(os.getenv("RAG_RESULT_CACHE_TTL", 600))
+DEFAULT_MAX_ENTRIES = int(os.getenv("RAG_RESULT_CACHE_SIZE", 2048))
+
+
+def bump_version(source, version_file=DEFAULT_VERSION_FILE):
+    """Mark the indexed corpus as changed (call at the end of every ingestion)."""
+    path = Path(version_file).expanduser()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    marker = {"version": uuid.uuid4().hex, "source": source, "updated_at": time.time()}
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(marker), encoding="utf-8")
+    os.replace(tmp, path)
+    return marker
+
+
+class ResultCache:
+    def __init__(self, version_file=DEFAULT_VERSION_FILE, ttl_s=DEFAULT_TTL_S, max_entries=DEFAULT_MAX_ENTRIES,
+                 on_invalidate=None):
+        self.version_file = Path(version_file).expanduser()
+        self.on_invalidate = on_invalidate
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, response_json)
+        self._lock = threading.Lock()
+        self._version = self._read_version()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _read_version(self):
+        try:
+            st = os.stat(self.version_file)
+            return (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            return None
+
+    def _check_version(self):
+        version = self._read_version()
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+            self.invalidations += 1
+            if self.on_invalidate:
+                self.on_invalidate()
+
+    @staticmethod
+    def key(query_vector, limit, **params):
+        digest = hashlib.sha1(array("f", query_vector).tobytes())
+        digest.update(json.dumps([limit, params], sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        return self.lookup(key)[0]
+
+    def lookup(self, key):
+        """(response or None, collection version seen by this lookup); pass the version to put()."""
+        with self._lock:
+            self._check_version()
+            version = self._version
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None, version
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Stored serialized: callers mutate responses (snippets, fusion), the cache must not see it
+        return json.loads(entry[1]), version
+
+    def put(self, key, response, version=None):
+        """Store a response computed after lookup() returned `version`.
+
+        Dropped when the collection was re-indexed in between (another thread's lookup may
+        already have switched to the new version): it may hold pre-re-index results.
+        """
+        payload = json.dumps(response)
+        with self._lock:
+            self._check_version()
+            if version is not None and version != self._version:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_s, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "invalidations": self.invalidations,
+            "ttl_s": self.ttl_s,
+            "version_file": str(self.version_file),
+        }
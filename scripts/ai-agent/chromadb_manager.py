@@ -1,60 +1,403 @@
 #!/usr/bin/env python3
 """ChromaDB Manager for EasyWay AI Agent"""
 
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 import json
 import sys
 import os
+import re
+import time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
 from pathlib import Path
 
 # Add local bin to path just in case
 sys.path.append(os.path.expanduser("~/.local/lib/python3.12/site-packages"))
 
+# Shared retrieval helpers (embedding cache) live next to rag_search.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "agents", "skills", "retrieval"))
+try:
+    from embedding_cache import EmbeddingCache
+except ImportError:  # standalone deployment (~/chromadb_manager.py): run without cache
+    EmbeddingCache = None
+try:
+    from embedder import get_embedder, cache_namespace, DEFAULT_BACKEND as EMBEDDER_BACKEND
+except ImportError:  # standalone deployment: PyTorch SentenceTransformer only
+    get_embedder = None
+
+# Content-hash manifest (incremental re-index) is shared with scripts/python/chroma_bridge.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+try:
+    from kb_manifest import IndexManifest, content_hash
+except ImportError:  # standalone deployment: every index run re-embeds
+    IndexManifest = None
+try:
+    from kb_dedup import DEDUP_MODE, DEDUP_MODES, DEDUP_THRESHOLD, NearDuplicateIndex, annotate_duplicates
+except ImportError:  # standalone deployment: no near-duplicate detection
+    NearDuplicateIndex, DEDUP_MODE, DEDUP_MODES, DEDUP_THRESHOLD = None, "off", ("off",), 0.0
+try:
+    from kb_telemetry import TELEMETRY_STREAM, IngestTelemetry
+except ImportError:  # standalone deployment: stage timings are not collected
+    TELEMETRY_STREAM = None
+
+    class IngestTelemetry:
+        def __init__(self, *args, **kwargs): pass
+        def stage(self, *args, **kwargs): return nullcontext()
+        def observe(self, *args, **kwargs): pass
+        def count(self, *args, **kwargs): pass
+        def batch(self, **fields): pass
+        def finish(self): return None
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# index-dir: chunks encoded per model call, and default file filter
+ENCODE_BATCH_SIZE = int(os.environ.get("KB_ENCODE_BATCH_SIZE", "256"))
+DEFAULT_INCLUDE = ["*.md"]
+
+# Chunking: windows of at most CHUNK_TOKENS model tokens, consecutive windows share CHUNK_OVERLAP
+CHUNK_TOKENS = int(os.environ.get("KB_CHUNK_TOKENS", "200"))
+CHUNK_OVERLAP = int(os.environ.get("KB_CHUNK_OVERLAP", "40"))
+
+HEADING_RE = re.compile(r'#{1,6}[ \t]+(.+?)[ \t#]*$')
+FENCE_RE = re.compile(r'[ \t]*(```|~~~)')
+WORD_RE = re.compile(r'\w+|[^\w\s]')
+
+def word_spans(text):
+    """(start, end) offsets of word/punctuation tokens: fallback when no model tokenizer is available"""
+    return [m.span() for m in WORD_RE.finditer(text)]
+
+def split_sections(text):
+    """Split markdown at headings: [(start, end, heading)], each section starting at its heading line"""
+    starts, offset, in_fence = [], 0, False
+    for line in text.splitlines(keepends=True):
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        elif not in_fence:
+            m = HEADING_RE.match(line.rstrip("\r\n"))
+            if m:
+                starts.append((offset, m.group(1).strip()))  # '# comment' inside code is not a heading
+        offset += len(line)
+    if not starts or starts[0][0] > 0:
+        starts.insert(0, (0, ""))
+    sections = []
+    for i, (start, heading) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else len(text)
+        if text[start:end].strip():
+            sections.append((start, end, heading))
+    return sections
+
+def chunk_document(text, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP, token_spans=word_spans):
+    """Heading-aligned chunks with token-bounded, overlapping windows.
+
+    Returns [{"text", "start", "end", "heading"}]; start/end are character offsets
+    into `text`, so a hit can be mapped back to the exact passage of the file.
+    """
+    step = max(max_tokens - overlap, 1)
+    chunks = []
+    for sec_start, sec_end, heading in split_sections(text):
+        spans = token_spans(text[sec_start:sec_end])
+        for first in range(0, max(len(spans), 1), step):
+            window = spans[first:first + max_tokens]
+            if not window:
+                break
+            start, end = sec_start + window[0][0], sec_start + window[-1][1]
+            chunks.append({"text": text[start:end], "start": start, "end": end, "heading": heading})
+            if first + max_tokens >= len(spans):
+                break
+    return chunks
+
+def tokenizer_spans(tokenizer, text):
+    """Character offsets of the model's own tokens (fast tokenizer), word tokens otherwise"""
+    if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+        return word_spans(text)
+    return tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)["offset_mapping"]
+
+def prepare_document(doc_path, doc_id, chunk_tokens, chunk_overlap, tokenizer=None, known_hash=None, signer=None):
+    """Read, hash and chunk one file. chunks is None when the hash equals known_hash (unchanged).
+    With a signer (NearDuplicateIndex) the MinHash signature is computed, unchanged files included.
+    Stage durations (seconds) are returned under "timings"."""
+    started = time.perf_counter()
+    with open(doc_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    timings = {"read": time.perf_counter() - started}
+
+    metadata = {"doc_id": doc_id, "filename": Path(doc_path).name, "path": str(doc_path)}
+    # Chunking settings are part of the hash: changing them re-embeds the file
+    digest = content_hash(content, {**metadata, "chunking": [chunk_tokens, chunk_overlap]}) if IndexManifest else None
+    doc = {"doc_id": doc_id, "path": str(doc_path), "source": str(Path(doc_path).resolve()), "digest": digest,
+           "chunks": None, "signature": None, "timings": timings}
+    if signer:
+        started = time.perf_counter()
+        doc["signature"] = signer.signature(content)
+        timings["signature"] = time.perf_counter() - started
+    if digest is not None and digest == known_hash:
+        return doc
+
+    started = time.perf_counter()
+    chunks = chunk_document(content, chunk_tokens, chunk_overlap, lambda text: tokenizer_spans(tokenizer, text))
+    timings["chunk"] = time.perf_counter() - started
+    doc["chunks"] = [{**c, "metadata": {**metadata, "chunk_index": i, "chunk_count": len(chunks),
+                                         "start": c["start"], "end": c["end"], "heading": c["heading"]}}
+                     for i, c in enumerate(chunks)]
+    return doc
+
+def walk_files(root, include=None, exclude=None):
+    """Files under root whose root-relative path (or name) matches an include glob and no exclude glob"""
+    include, exclude = include or DEFAULT_INCLUDE, exclude or []
+    matches = lambda rel, patterns: any(fnmatch(rel, p) or fnmatch(rel.rsplit("/", 1)[-1], p) for p in patterns)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            path = Path(dirpath) / name
+            rel = path.relative_to(root).as_posix()
+            if matches(rel, include) and not matches(rel, exclude):
+                yield path, rel
+
+# index-dir worker processes: tokenizer and chunking settings are sent once, at pool start
+_worker = {}
+
+def _init_worker(tokenizer, chunk_tokens, chunk_overlap, known_hashes, dedup):
+    # Signatures are comparable across processes: NearDuplicateIndex permutations are seeded
+    _worker.update(tokenizer=tokenizer, chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap,
+                   known_hashes=known_hashes, signer=NearDuplicateIndex() if dedup != "off" else None)
+
+def _prepare_in_worker(task):
+    doc_path, doc_id = task
+    try:
+        return prepare_document(doc_path, doc_id, _worker["chunk_tokens"], _worker["chunk_overlap"],
+                                _worker["tokenizer"], _worker["known_hashes"].get(doc_id), _worker["signer"])
+    except (OSError, UnicodeDecodeError) as e:
+        return {"doc_id": doc_id, "path": str(doc_path), "error": str(e)}
+
 class KnowledgeBaseManager:
+    """chromadb and the embedding model are loaded on first use (client/collection/embedder),
+    so cache-stats and cached query embeddings don't pay their import cost."""
+
     def __init__(self, persist_dir="~/easyway-kb"):
         self.persist_dir = Path(persist_dir).expanduser()
         self.persist_dir.mkdir(parents=True, exist_ok=True)
-        
-        # ChromaDB client
-        self.client = chromadb.PersistentClient(path=str(self.persist_dir))
-        
-        # Embedding model (all-MiniLM-L6-v2: fast, CPU-friendly)
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
-        
-        # Collection
-        self.collection = self.client.get_or_create_collection(
-            name="easyway_knowledge",
-            metadata={"description": "EasyWay agent knowledge base"}
-        )
+        self._client = None
+        self._collection = None
+        self._embedder = None
+
+        # Query embedding cache (in-process LRU + on-disk SQLite, shared across runs)
+        self.query_cache = None
+        if EmbeddingCache:
+            self.query_cache = EmbeddingCache(cache_namespace(MODEL_NAME, EMBEDDER_BACKEND) if get_embedder else MODEL_NAME)
+
+        # doc_id -> content hash of what is currently embedded (next to the Chroma files)
+        self.manifest = IndexManifest.for_directory(self.persist_dir) if IndexManifest else None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import chromadb
+            self._client = chromadb.PersistentClient(path=str(self.persist_dir))
+        return self._client
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = self.client.get_or_create_collection(
+                name="easyway_knowledge",
+                metadata={"description": "EasyWay agent knowledge base"}
+            )
+        return self._collection
+
+    @property
+    def embedder(self):
+        # Embedding model (all-MiniLM-L6-v2: fast, CPU-friendly); torch or ONNX Runtime via RAG_EMBEDDER
+        if self._embedder is None:
+            if get_embedder:
+                self._embedder = get_embedder(MODEL_NAME, EMBEDDER_BACKEND)
+            else:
+                from sentence_transformers import SentenceTransformer
+                self._embedder = SentenceTransformer(MODEL_NAME)
+        return self._embedder
+
+    @property
+    def chunk_tokens(self):
+        # Windows must fit the model input (max_seq_length includes [CLS]/[SEP])
+        return min(CHUNK_TOKENS, (getattr(self.embedder, "max_seq_length", None) or 256) - 2)
+
+    @property
+    def chunk_overlap(self):
+        return min(CHUNK_OVERLAP, self.chunk_tokens // 2)
     
+    def remove_document(self, doc_ids):
+        """Delete every chunk of the given documents (and pre-chunking whole-file entries)"""
+        self.collection.delete(where={"doc_id": {"$in": list(doc_ids)}})
+        self.collection.delete(ids=list(doc_ids))
+
+    def known_hash(self, doc_id):
+        entry = self.manifest.entries.get(doc_id) if self.manifest else None
+        return entry["hash"] if entry else None
+
+    def write_documents(self, docs, embeddings):
+        """Replace the chunks of prepared documents with new ones, in bulk add calls"""
+        self.remove_document([d["doc_id"] for d in docs])
+        chunks = [(d["doc_id"], i, c) for d in docs for i, c in enumerate(d["chunks"])]
+        max_batch = self.client.get_max_batch_size() if hasattr(self.client, "get_max_batch_size") else 5000
+        for start in range(0, len(chunks), max_batch):
+            part = chunks[start:start + max_batch]
+            self.collection.add(
+                documents=[c["text"] for _, _, c in part],
+                embeddings=embeddings[start:start + max_batch],
+                ids=[f"{doc_id}#{i}" for doc_id, i, _ in part],
+                metadatas=[c["metadata"] for _, _, c in part]
+            )
+        if self.manifest:
+            for d in docs:
+                self.manifest.record(d["doc_id"], d["digest"], d["source"])
+
     def index_document(self, doc_path, doc_id=None):
-        """Index a document into ChromaDB"""
-        with open(doc_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
+        """Chunk a document and index its chunks into ChromaDB (skipped when unchanged)"""
+        indexed = self.manifest.ids_with_source(Path(doc_path).resolve()) if self.manifest else []
         if doc_id is None:
-            doc_id = f"doc_{Path(doc_path).stem}"
+            # A file is stored once: keep the id index-dir gave it (root-relative path) if any
+            doc_id = indexed[0] if indexed else f"doc_{Path(doc_path).stem}"
+        aliases = [i for i in indexed if i != doc_id]
+        if aliases:  # same file indexed under another id (index and index-dir used to disagree)
+            self.remove_document(aliases)
+            self.manifest.forget(aliases)
+
+        telemetry = IngestTelemetry("chromadb_manager.index")
+        doc = prepare_document(doc_path, doc_id, self.chunk_tokens, self.chunk_overlap,
+                               getattr(self.embedder, "tokenizer", None), self.known_hash(doc_id))
+        if doc["chunks"] is None:
+            if self.manifest:
+                self.manifest.save()
+            print(json.dumps({"status": "unchanged", "id": doc_id, "file": str(doc_path)}))
+            return doc_id
+        for stage, seconds in doc["timings"].items():
+            telemetry.observe(stage, seconds, items=len(doc["chunks"]) if stage == "chunk" else 1)
         
-        # Generate embedding
-        embedding = self.embedder.encode(content).tolist()
+        # One encode call for all chunks of the file
+        texts = [c["text"] for c in doc["chunks"]]
+        with telemetry.stage("encode", items=len(texts)):
+            embeddings = self.embedder.encode(texts).tolist() if texts else []
         
-        # Add to collection
-        self.collection.add(
-            documents=[content],
-            embeddings=[embedding],
-            ids=[doc_id],
-            metadatas=[{"filename": Path(doc_path).name, "path": str(doc_path)}]
-        )
+        # A changed document may have fewer chunks than before: its old chunks are dropped first
+        with telemetry.stage("upsert", items=len(texts)):
+            self.write_documents([doc], embeddings)
+        if self.manifest:
+            self.manifest.save()
         
         # Output JSON for PowerShell to parse easily
-        print(json.dumps({"status": "indexed", "id": doc_id, "file": str(doc_path)}))
+        print(json.dumps({"status": "indexed", "id": doc_id, "file": str(doc_path), "chunks": len(texts),
+                          "telemetry": telemetry.finish()}))
         return doc_id
+
+    def index_directory(self, root, include=None, exclude=None, workers=None, batch_size=ENCODE_BATCH_SIZE,
+                        dedup=DEDUP_MODE, dedup_threshold=DEDUP_THRESHOLD, telemetry_stream=TELEMETRY_STREAM):
+        """Incrementally index a tree: files are read and chunked in a process pool, chunks
+        are encoded in large batches on this process's model and written with bulk adds.
+        Files deleted since the last run are removed from the collection. Near-duplicates of
+        an earlier file are not embedded (dedup="skip"; "merge" also lists them in the kept
+        file's "duplicates" metadata), but whatever is already indexed for them is kept.
+
+        Stage timings go to the "telemetry" summary: read/signature/chunk are measured in
+        the workers (summed across them), "wait" is the time this process blocks on the pool."""
+        root = Path(root).expanduser().resolve()
+        started = time.perf_counter()
+        telemetry = IngestTelemetry("chromadb_manager.index-dir", stream=telemetry_stream)
+        # doc ids are root-relative paths, so same-named files in different folders do not collide
+        tasks = [(str(path), f"doc_{os.path.splitext(rel)[0]}") for path, rel in walk_files(root, include, exclude)]
+        known = {doc_id: digest for _, doc_id in tasks if (digest := self.known_hash(doc_id))}
+
+        stats = {"files": len(tasks), "indexed": 0, "unchanged": 0, "duplicates": 0, "errors": [], "chunks": 0,
+                 "batches": 0}
+        pending, pending_chunks = [], 0
+        near_dups = NearDuplicateIndex(dedup_threshold) if dedup != "off" else None
+        merged, seen = {}, set()
+
+        def flush():
+            nonlocal pending, pending_chunks
+            texts = [c["text"] for d in pending for c in d["chunks"]]
+            with telemetry.stage("encode", items=len(texts)):
+                embeddings = self.embedder.encode(texts, batch_size=batch_size).tolist() if texts else []
+            with telemetry.stage("upsert", items=len(texts)):
+                self.write_documents(pending, embeddings)
+            if self.manifest:
+                self.manifest.save()  # an interrupted run keeps the batches already written
+            stats["indexed"] += len(pending)
+            stats["chunks"] += len(texts)
+            stats["batches"] += 1
+            telemetry.batch(files=len(pending), chunks=len(texts))
+            pending, pending_chunks = [], 0
+
+        tokenizer = getattr(self.embedder, "tokenizer", None)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(tokenizer, self.chunk_tokens, self.chunk_overlap, known, dedup)) as pool:
+            # pool.map keeps walk order, so the first file of a near-duplicate group is the one kept
+            results = pool.map(_prepare_in_worker, tasks, chunksize=8)
+            while True:
+                with telemetry.stage("wait"):
+                    doc = next(results, None)
+                if doc is None:
+                    break
+                if "error" in doc:
+                    seen.add(doc["doc_id"])  # unreadable this time: keep what is indexed
+                    stats["errors"].append({"file": doc["path"], "error": doc["error"]})
+                    continue
+                for stage, seconds in doc["timings"].items():
+                    telemetry.observe(stage, seconds, items=len(doc["chunks"]) if stage == "chunk" else 1)
+                match = None
+                if near_dups:
+                    with telemetry.stage("dedup"):
+                        match = near_dups.check(doc["doc_id"], signature=doc["signature"])
+                if match:
+                    seen.add(doc["doc_id"])  # skipped, not deleted: prune leaves what is indexed for it
+                    stats["duplicates"] += 1
+                    merged.setdefault(match[0], []).append(doc["doc_id"])
+                    continue
+                seen.add(doc["doc_id"])
+                if doc["chunks"] is None:
+                    stats["unchanged"] += 1
+                else:
+                    pending.append(doc)
+                    pending_chunks += len(doc["chunks"])
+                    if pending_chunks >= batch_size:
+                        flush()
+        if pending:
+            flush()
+        if dedup == "merge" and merged:
+            annotate_duplicates(self.collection, merged, doc_id_field="doc_id")
+
+        removed = []
+        if self.manifest:
+            # includes doc_<stem> entries left by the index command for files now indexed here
+            removed = [doc_id for doc_id in self.manifest.ids_from_source(str(root) + os.sep) if doc_id not in seen]
+            if removed:
+                self.remove_document(removed)
+                self.manifest.forget(removed)
+            self.manifest.save()
+
+        for name in ("files", "indexed", "unchanged", "duplicates", "chunks"):
+            telemetry.count(name, stats[name])
+        telemetry.count("errors", len(stats["errors"]))
+        telemetry.count("removed", len(removed))
+        elapsed = time.perf_counter() - started
+        return {
+            "status": "indexed",
+            "root": str(root),
+            **stats,
+            "removed": removed,
+            "elapsed_s": round(elapsed, 3),
+            "files_per_sec": round(len(tasks) / elapsed, 2) if elapsed else 0.0,
+            "chunks_per_sec": round(stats["chunks"] / elapsed, 2) if elapsed else 0.0,
+            "telemetry": telemetry.finish(),
+        }
     
+    def embed_query(self, query):
+        """Encode a query, reusing the cached vector when the same query was seen before"""
+        if self.query_cache is None:
+            return self.embedder.encode(query).tolist()
+        return self.query_cache.get_or_encode([query], lambda texts: self.embedder.encode(texts).tolist())[0]
+
     def search(self, query, top_k=3):
         """Semantic search"""
-        query_embedding = self.embedder.encode(query).tolist()
+        query_embedding = self.embed_query(query)
         
         results = self.collection.query(
             query_embeddings=[query_embedding],
@@ -79,22 +422,43 @@ class KnowledgeBaseManager:
 
 if __name__ == "__main__":
     try:
-        kb = KnowledgeBaseManager()
-        
         if len(sys.argv) < 2:
-            print(json.dumps({"error": "Usage: script.py index <file> OR search <query>"}))
+            print(json.dumps({"error": "Usage: script.py index <file> OR index-dir <dir> [--include GLOB] [--exclude GLOB] [--workers N] [--batch-size N] [--dedup skip|merge|off] [--telemetry-stream stderr|FILE] OR search <query> OR cache-stats"}))
             sys.exit(1)
-        
+
+        kb = KnowledgeBaseManager()
         command = sys.argv[1]
         
         if command == "index":
             doc_path = sys.argv[2]
             kb.index_document(doc_path)
+
+        elif command == "index-dir":
+            import argparse
+            parser = argparse.ArgumentParser(prog="chromadb_manager.py index-dir")
+            parser.add_argument("root")
+            parser.add_argument("--include", action="append", help="Glob on the relative path or name (default *.md)")
+            parser.add_argument("--exclude", action="append")
+            parser.add_argument("--workers", type=int, help="Read/chunk processes (default: CPU count)")
+            parser.add_argument("--batch-size", type=int, default=ENCODE_BATCH_SIZE, help="Chunks per encode call")
+            parser.add_argument("--dedup", choices=DEDUP_MODES, default=DEDUP_MODE,
+                                help="Near-duplicate files: skip them, merge them into the kept one, or off (default; KB_DEDUP_MODE)")
+            parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD,
+                                help="Estimated Jaccard similarity above which a file is a near-duplicate")
+            parser.add_argument("--telemetry-stream", default=TELEMETRY_STREAM,
+                                help="Per-batch stage timings as JSON lines: 'stderr' or a file path")
+            args = parser.parse_args(sys.argv[2:])
+            print(json.dumps(kb.index_directory(args.root, args.include, args.exclude, args.workers, args.batch_size,
+                                                args.dedup, args.dedup_threshold, args.telemetry_stream)))
         
         elif command == "search":
             query = " ".join(sys.argv[2:])
             results = kb.search(query)
             print(json.dumps(results))
+
+        elif command == "cache-stats":
+            stats = kb.query_cache.stats() if kb.query_cache else {"enabled": False}
+            print(json.dumps(stats))
             
     except Exception as e:
         print(json.dumps({"error": str(e)}))
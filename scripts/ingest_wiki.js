@@ -3,6 +3,7 @@ import { pipeline } from '@xenova/transformers';
 import { glob } from 'glob';
 import fs from 'fs/promises';
 import path from 'path';
+import os from 'os';
 import { v4 as uuidv4 } from 'uuid';
 
 // Configuration
@@ -10,6 +11,38 @@ const QDRANT_URL = process.env.QDRANT_URL || 'http://localhost:6333';
 const QDRANT_API_KEY = process.env.QDRANT_API_KEY;
 const COLLECTION_NAME = 'easyway_wiki';
 const WIKI_PATH = process.env.WIKI_PATH || '../Wiki';
+// Set QDRANT_QUANTIZATION=int8 to store an int8 copy of the vectors (searched first, rescored in float32)
+const QDRANT_QUANTIZATION = process.env.QDRANT_QUANTIZATION;
+// Version marker watched by rag_search.py's result cache (any change invalidates cached answers)
+const INDEX_VERSION_FILE = process.env.RAG_INDEX_VERSION_FILE
+    || path.join(os.homedir(), '.cache', 'easyway', 'easyway_wiki.version');
+// Payload indexes for metadata-filtered search (rag_search.py PAYLOAD_INDEXES lists the same fields)
+const PAYLOAD_INDEXES = {
+    section: 'keyword',
+    domain: 'keyword',
+    type: 'keyword',
+    tags: 'keyword',
+    filename: 'keyword',
+    chunk_index: 'integer',
+};
+
+// Filterable page metadata: top-level Wiki folder + front-matter tags/domain/type
+function pageMetadata(file, content) {
+    const parts = path.relative(WIKI_PATH, file).split(path.sep);
+    if (parts.length > 1 && parts[0].endsWith('.wiki')) parts.shift();
+    const meta = { section: parts.length > 1 ? parts[0] : 'root', tags: [] };
+
+    const frontMatter = content.match(/^---\r?\n([\s\S]*?)\r?\n---/);
+    if (frontMatter) {
+        const tags = frontMatter[1].match(/^tags:\s*\[(.*)\]\s*$/m);
+        if (tags) meta.tags = tags[1].split(',').map(t => t.trim().replace(/^['"]|['"]$/g, '')).filter(Boolean);
+        const type = frontMatter[1].match(/^type:\s*(\S+)\s*$/m);
+        if (type) meta.type = type[1];
+    }
+    const domain = meta.tags.find(t => t.startsWith('domain/') && t.length > 'domain/'.length);
+    if (domain) meta.domain = domain.slice('domain/'.length);
+    return meta;
+}
 
 async function main() {
     console.log(`🚀 Starting Ingestion (The Feeder)...`);
@@ -37,6 +70,11 @@ async function main() {
                     size: 384,
                     distance: 'Cosine',
                 },
+                ...(QDRANT_QUANTIZATION === 'int8' && {
+                    quantization_config: {
+                        scalar: { type: 'int8', quantile: 0.99, always_ram: true },
+                    },
+                }),
             });
         }
     } catch (e) {
@@ -44,6 +82,16 @@ async function main() {
         process.exit(1);
     }
 
+    // 3b. Payload indexes on the filterable fields (no-op when they already exist)
+    for (const [field, schema] of Object.entries(PAYLOAD_INDEXES)) {
+        try {
+            await client.createPayloadIndex(COLLECTION_NAME, { field_name: field, field_schema: schema, wait: true });
+        } catch (e) {
+            console.error(`Error creating payload index on '${field}': ${e.message}`);
+            process.exit(1);
+        }
+    }
+
     // 4. Read Wiki Files
     console.log(`Reading Wiki files from ${WIKI_PATH}...`);
     const files = await glob(`${WIKI_PATH}/**/*.md`);
@@ -54,6 +102,7 @@ async function main() {
     for (const file of files) {
         const content = await fs.readFile(file, 'utf-8');
         const filename = path.basename(file);
+        const metadata = pageMetadata(file, content);
 
         // Simple Chunking (by paragraphs/headers for now)
         // Ideally: Use a smarter chunker. Here we split by double newline.
@@ -76,7 +125,8 @@ async function main() {
                     filename: filename,
                     path: file,
                     content: chunkText,
-                    chunk_index: i
+                    chunk_index: i,
+                    ...metadata
                 },
                 vector: vector
             });
@@ -94,7 +144,16 @@ async function main() {
         }
     }
 
+    await bumpIndexVersion();
     console.log(`✅ Ingestion Complete! Total chunks indexed: ${totalPoints}`);
 }
 
+async function bumpIndexVersion() {
+    const marker = { version: uuidv4().replace(/-/g, ''), source: 'ingest_wiki.js', updated_at: Date.now() / 1000 };
+    await fs.mkdir(path.dirname(INDEX_VERSION_FILE), { recursive: true });
+    const tmp = `${INDEX_VERSION_FILE}.tmp`;
+    await fs.writeFile(tmp, JSON.stringify(marker));
+    await fs.rename(tmp, INDEX_VERSION_FILE);
+}
+
 main().catch(console.error);
@@ -21,20 +21,24 @@ KB_FILES=(
 
 SCAN_FAILED=0
 
+# Only the staged KB files, and only their added/modified lines (--staged):
+# unchanged lines are skipped and repeated lines come from the findings cache
+STAGED_KB_FILES=()
 for KB_FILE in "${KB_FILES[@]}"; do
-    if [ -f "$KB_FILE" ]; then
-        # Check if file is staged for commit
-        if git diff --cached --name-only | grep -q "$KB_FILE"; then
-            echo "  Scanning: $KB_FILE"
-            python3 scripts/kb-security-scan.py "$KB_FILE"
-            
-            if [ $? -ne 0 ]; then
-                SCAN_FAILED=1
-            fi
-        fi
+    if git diff --cached --name-only | grep -qxF "$KB_FILE"; then
+        STAGED_KB_FILES+=("$KB_FILE")
     fi
 done
 
+if [ ${#STAGED_KB_FILES[@]} -gt 0 ]; then
+    echo "  Scanning staged changes: ${STAGED_KB_FILES[*]}"
+    python3 scripts/python/kb-security-scan.py --staged "${STAGED_KB_FILES[@]}"
+    
+    if [ $? -ne 0 ]; then
+        SCAN_FAILED=1
+    fi
+fi
+
 if [ $SCAN_FAILED -ne 0 ]; then
     echo ""
     echo "❌ KB integrity check FAILED"
@@ -43,7 +47,7 @@ if [ $SCAN_FAILED -ne 0 ]; then
     echo "To fix:"
     echo "  1. Review violations above"
     echo "  2. Remove suspicious patterns from KB"
-    echo "  3. Run: python3 scripts/kb-security-scan.py <file>"
+    echo "  3. Run: python3 scripts/python/kb-security-scan.py <file>"
     echo "  4. Commit again after fixes"
     echo ""
     echo "To bypass (NOT RECOMMENDED):"
@@ -6,7 +6,12 @@
 
 param(
     [string]$WikiRoot = "Wiki/EasyWayData.wiki",
-    [switch]$Force
+    [int]$BatchSize = 64,
+    [switch]$Force,
+    # Near-duplicate chunks (MinHash): off = embed everything, skip = do not embed them,
+    # merge = skip and list them in the kept chunk's "duplicates" metadata
+    [ValidateSet('off', 'skip', 'merge')]
+    [string]$Dedup = 'off'
 )
 
 $ErrorActionPreference = "Stop"
@@ -14,50 +19,67 @@ $bridgeScript = Join-Path $PSScriptRoot "../python/chroma_bridge.py"
 
 Write-Host "🧠 Starting Vectorization Process..." -ForegroundColor Cyan
 
-# 1. Scan and Chunk Wiki
+# 1. Scan and Chunk Wiki (streamed: one JSON line per chunk, nothing accumulated in memory)
 $files = Get-ChildItem -Path $WikiRoot -Recurse -Filter "*.md"
-$documents = @()
-$metadatas = @()
-$ids = @()
 
-foreach ($file in $files) {
-    $content = Get-Content $file.FullName -Raw
-    # Simple chunking by header (naive)
-    $chunks = $content -split "(?m)^## "
-    
-    $i = 0
-    foreach ($chunk in $chunks) {
-        if ([string]::IsNullOrWhiteSpace($chunk)) { continue }
-        
-        # Clean up
-        $text = "## " + $chunk.Trim()
-        $id = "$($file.BaseName)_$i"
-        
-        $documents += $text
-        $metadatas += @{ source = $file.Name; path = $file.FullName }
-        $ids += $id
-        $i++
+$wikiRootPath = (Resolve-Path $WikiRoot).Path
+
+# Filterable metadata (same fields ingest_wiki.js stores in Qdrant payloads): section, domain, type
+function Get-PageMetadata($file, $content) {
+    $parts = [IO.Path]::GetRelativePath($wikiRootPath, $file.FullName) -split '[\\/]'
+    if ($parts.Count -gt 1 -and $parts[0] -like '*.wiki') { $parts = $parts[1..($parts.Count - 1)] }
+    $meta = @{ section = $(if ($parts.Count -gt 1) { $parts[0] } else { 'root' }) }
+    if ($content -match '(?s)^---\r?\n(.*?)\r?\n---') {
+        $frontMatter = $Matches[1]
+        if ($frontMatter -match '(?m)^tags:\s*\[.*?domain/([^,\]\s]+)') { $meta.domain = $Matches[1] }
+        if ($frontMatter -match '(?m)^type:\s*(\S+)\s*$') { $meta.type = $Matches[1] }
     }
+    return $meta
 }
 
-Write-Host "  > Found $($ids.Count) knowledge chunks." -ForegroundColor Gray
+$chunkStream = {
+    foreach ($file in $files) {
+        $content = Get-Content $file.FullName -Raw
+        $pageMeta = Get-PageMetadata $file $content
+        # Simple chunking by header (naive)
+        $chunks = $content -split "(?m)^## "
 
-# 2. Call Python Bridge
-$payload = @{
-    documents = $documents
-    metadatas = $metadatas
-    ids = $ids
+        $i = 0
+        foreach ($chunk in $chunks) {
+            if ([string]::IsNullOrWhiteSpace($chunk)) { continue }
+
+            # Clean up
+            $text = "## " + $chunk.Trim()
+            $id = "$($file.BaseName)_$i"
+
+            @{
+                id       = $id
+                document = $text
+                metadata = @{ source = $file.Name; path = $file.FullName } + $pageMeta
+            } | ConvertTo-Json -Depth 5 -Compress
+            $i++
+        }
+    }
 }
 
-$jsonPayload = $payload | ConvertTo-Json -Depth 5 -Compress
+Write-Host "  > Streaming chunks from $($files.Count) files (batch size $BatchSize)..." -ForegroundColor Gray
 
+# 2. Call Python Bridge
 # In a real container, we call python3. locally we check python availability
 try {
     # Check if we can reach the bridge
     if (-not (Test-Path $bridgeScript)) { throw "Bridge script not found at $bridgeScript" }
-    
-    # We pipe json to python to avoid command line limits
-    $jsonPayload | python $bridgeScript "upsert" | Out-Null
+
+    # JSON-lines are piped as they are produced; the bridge embeds + upserts per batch
+    # The stream is the whole Wiki: unchanged chunks are skipped, vanished ones pruned.
+    # -Force re-embeds everything. Deduplication is explicit (-Dedup); skipped duplicates are never pruned.
+    $options = @{ batch_size = $BatchSize; full = [bool]$Force; prune = $true; dedup = $Dedup } | ConvertTo-Json -Compress
+    $summary = & $chunkStream | python $bridgeScript "upsert-stream" $options | ConvertFrom-Json
+    Write-Host "  > Upserted $($summary.count) knowledge chunks in $($summary.batches) batches ($($summary.unchanged) unchanged, $($summary.duplicates) duplicates, $($summary.deleted) removed)." -ForegroundColor Gray
+    if ($summary.telemetry) {
+        $stages = $summary.telemetry.stages.PSObject.Properties | ForEach-Object { "$($_.Name) $($_.Value.total_s)s" }
+        Write-Host "  > Stages: $($stages -join ', ') (bottleneck: $($summary.telemetry.bottleneck))" -ForegroundColor Gray
+    }
     Write-Host "✅ Ingestion Complete. Knowledge stored in Cortex." -ForegroundColor Green
 } catch {
     Write-Warning "Failed to ingest vectors. Is Python/Chroma installed? (Runs best in Container)"
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+chroma_bridge Manifest Regression Check
+Runs the upsert/delete paths of chroma_bridge.py against a throw-away embedded
+Chroma store and checks that the content-hash manifest stays in step with the
+collection: documents deleted by id or by `where` are re-embedded when they are
+upserted again instead of being skipped as "unchanged".
+
+The embedding function is replaced by a constant stub, so no model is downloaded.
+
+Usage:
+    python3 check_chroma_bridge.py [--json]
+Exit code 1 when a check fails.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DOCUMENTS = ["Rollback a failed release from the deploy pipeline", "Rotate the Qdrant API key every quarter"]
+METADATAS = [{"domain": "devops"}, {"domain": "security"}]
+IDS = ["doc_rollback", "doc_rotate"]
+
+
+def stub_embedding(texts):
+    return [[1.0, 0.0, 0.0, 0.0] for _ in texts]
+
+
+def run_checks(bridge):
+    checks = []
+
+    def check(name, condition, detail):
+        checks.append({"check": name, "ok": bool(condition), "detail": detail})
+
+    first = bridge.upsert_documents(DOCUMENTS, METADATAS, IDS)
+    check("initial upsert embeds every document", first["count"] == 2, first["count"])
+    again = bridge.upsert_documents(DOCUMENTS, METADATAS, IDS)
+    check("unchanged documents are skipped", again["count"] == 0 and again["unchanged"] == 2,
+          {"count": again["count"], "unchanged": again["unchanged"]})
+
+    for label, request in (("ids", {"ids": ["doc_rollback"]}), ("where", {"where": {"domain": "devops"}})):
+        deleted = bridge.delete_documents(**request)
+        check(f"delete by {label} removes the document", deleted["deleted"] == 1, deleted["deleted"])
+        restored = bridge.upsert_documents(DOCUMENTS, METADATAS, IDS)
+        count = bridge.get_collection().count()
+        check(f"re-upsert after delete by {label} restores it", restored["count"] == 1 and count == 2,
+              {"count": restored["count"], "unchanged": restored["unchanged"], "collection": count})
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="chroma_bridge manifest regression check")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as store:
+        # chroma_bridge reads its configuration at import time
+        os.environ["CHROMA_PATH"] = store
+        sys.path.insert(0, SCRIPT_DIR)
+        import chroma_bridge
+        chroma_bridge._embedding_function = stub_embedding
+        checks = run_checks(chroma_bridge)
+
+    if args.json:
+        print(json.dumps(checks, indent=2))
+    else:
+        for c in checks:
+            print(f"{'ok  ' if c['ok'] else 'FAIL'}  {c['check']}  ({json.dumps(c['detail'])})")
+    sys.exit(0 if all(c["ok"] for c in checks) else 1)
+
+
+if __name__ == "__main__":
+    main()
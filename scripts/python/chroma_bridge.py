@@ -1,41 +1,263 @@
 import sys
 import os
 import json
+import socketserver
+import threading
+import time
 import chromadb
 from chromadb.utils import embedding_functions
+from collections import defaultdict
+from kb_manifest import IndexManifest, content_hash
+from kb_dedup import DEDUP_MODE, DEDUP_MODES, DEDUP_THRESHOLD, NearDuplicateIndex, annotate_duplicates
+from kb_telemetry import TELEMETRY_STREAM, IngestTelemetry
 
 # Configuration
 CHROMA_HOST = os.environ.get("CHROMA_HOST", "localhost")
 CHROMA_PORT = os.environ.get("CHROMA_PORT", "8000")
+CHROMA_PATH = os.environ.get("CHROMA_PATH")  # embedded PersistentClient (benchmarks, offline runs)
 COLLECTION_NAME = "easyway_knowledge"
+UPSERT_BATCH_SIZE = int(os.environ.get("CHROMA_UPSERT_BATCH_SIZE", "64"))
+# Content-hash manifest (incremental upserts) lives next to the Chroma data (embedded mode);
+# for a server it is bound to host/port + collection id, so a recreated collection is re-indexed
+MANIFEST_DIR = CHROMA_PATH or os.environ.get("CHROMA_MANIFEST_DIR", os.path.expanduser("~/.cache/easyway/chroma_bridge"))
+
+# Server mode: one client, collection and manifest for the life of the process
+SERVE_SOCKET = os.environ.get("CHROMA_BRIDGE_SOCKET", os.path.expanduser("~/.cache/easyway/chroma_bridge.sock"))
+
+_collection = None
+_target = None  # identity of the store behind _collection; None for the in-memory fallback
+_manifest = None
+_embedding_function = None
+_lock = threading.Lock()  # serializes operations coming from concurrent socket clients
 
 def get_client():
+    """(client, store identity); the identity is None for the in-memory fallback"""
+    if CHROMA_PATH:
+        return chromadb.PersistentClient(path=CHROMA_PATH), {"path": os.path.abspath(CHROMA_PATH)}
     # Attempt to connect to remote Chroma (Container), fall back to ephemeral for test
     try:
-        return chromadb.HttpClient(host=CHROMA_HOST, port=int(CHROMA_PORT))
+        return chromadb.HttpClient(host=CHROMA_HOST, port=int(CHROMA_PORT)), {"host": CHROMA_HOST, "port": int(CHROMA_PORT)}
     except:
-        return chromadb.Client() # In-memory fallback
+        return chromadb.Client(), None # In-memory fallback
 
-def upsert_documents(documents, metadatas, ids):
-    client = get_client()
-    # Default embedding function (all-MiniLM-L6-v2) is automatic if not specified
-    # For container usage, we ensure chromadb is installed with default deps
-    collection = client.get_or_create_collection(name=COLLECTION_NAME)
-    
-    collection.upsert(
-        documents=documents,
-        metadatas=metadatas,
-        ids=ids
-    )
-    print(json.dumps({"status": "success", "count": len(ids)}))
+def get_collection():
+    global _collection, _target
+    if _collection is None:
+        # Default embedding function (all-MiniLM-L6-v2) is automatic if not specified
+        # For container usage, we ensure chromadb is installed with default deps
+        client, store = get_client()
+        _collection = client.get_or_create_collection(name=COLLECTION_NAME)
+        _target = {**store, "collection": COLLECTION_NAME, "collection_id": str(_collection.id)} if store else None
+    return _collection
+
+def get_embedding_function():
+    """The collection's default embedding function, called explicitly so encode and upsert are timed apart"""
+    global _embedding_function
+    if _embedding_function is None:
+        _embedding_function = embedding_functions.DefaultEmbeddingFunction()
+    return _embedding_function
+
+def get_manifest():
+    global _manifest
+    if _manifest is None:
+        get_collection()
+        # The in-memory fallback store vanishes with the process: nothing it holds may be recorded
+        _manifest = IndexManifest.for_directory(MANIFEST_DIR, _target) if _target else IndexManifest(None)
+    return _manifest
+
+def prune_missing(collection, manifest, seen_ids):
+    """Delete documents recorded in the manifest but absent from a full run."""
+    stale = [doc_id for doc_id in manifest.entries if doc_id not in seen_ids]
+    if stale:
+        collection.delete(ids=stale)
+        manifest.forget(stale)
+    return len(stale)
+
+def upsert_documents(documents, metadatas, ids, full=False, prune=False, dedup=DEDUP_MODE,
+                     dedup_threshold=DEDUP_THRESHOLD, telemetry_stream=TELEMETRY_STREAM):
+    collection = get_collection()
+    manifest = get_manifest()
+    near_dups = NearDuplicateIndex(dedup_threshold) if dedup != "off" else None
+    merged = defaultdict(list)
+    telemetry = IngestTelemetry("chroma_bridge.upsert", stream=telemetry_stream)
+
+    # Only new or changed documents are embedded (unless a full re-index is requested);
+    # near-duplicates of an earlier document in the batch are not embedded at all
+    changed, kept = [], set()
+    with telemetry.stage("dedup", items=len(ids)):
+        for i, doc_id in enumerate(ids):
+            match = near_dups.check(doc_id, documents[i]) if near_dups else None
+            if match:
+                merged[match[0]].append(doc_id)
+                continue
+            kept.add(doc_id)
+            digest = content_hash(documents[i], metadatas[i] if metadatas else None)
+            if full or not manifest.is_unchanged(doc_id, digest):
+                changed.append((i, digest))
+
+    if changed:
+        batch_docs = [documents[i] for i, _ in changed]
+        with telemetry.stage("encode", items=len(changed)):
+            embeddings = get_embedding_function()(batch_docs)
+        with telemetry.stage("upsert", items=len(changed)):
+            collection.upsert(
+                documents=batch_docs,
+                embeddings=embeddings,
+                metadatas=[metadatas[i] for i, _ in changed] if metadatas else None,
+                ids=[ids[i] for i, _ in changed]
+            )
+        for i, digest in changed:
+            manifest.record(ids[i], digest)
+        telemetry.batch(count=len(changed))
+
+    if dedup == "merge" and merged:
+        annotate_duplicates(collection, merged)
+    # Skipped duplicates were passed by the caller: prune leaves whatever is indexed for them
+    skipped_dups = {doc_id for dups in merged.values() for doc_id in dups}
+    deleted = prune_missing(collection, manifest, kept | skipped_dups) if prune else 0
+    manifest.save()
+    duplicates = sum(len(d) for d in merged.values())
+    for name, n in (("documents", len(ids)), ("embedded", len(changed)), ("duplicates", duplicates), ("deleted", deleted)):
+        telemetry.count(name, n)
+    return {"status": "success", "count": len(changed), "unchanged": len(kept) - len(changed),
+            "duplicates": duplicates, "deleted": deleted, "telemetry": telemetry.finish()}
+
+def upsert_stream(lines, batch_size=UPSERT_BATCH_SIZE, full=False, prune=False, dedup=DEDUP_MODE,
+                  dedup_threshold=DEDUP_THRESHOLD, telemetry_stream=TELEMETRY_STREAM):
+    """Upsert JSON-lines documents ({"id", "document", "metadata"}) in fixed-size batches.
+
+    Only one batch is held in memory at a time, so peak memory does not depend on
+    the size of the knowledge base. Progress is reported on stderr, one JSON line per batch.
+    Documents whose content hash matches the manifest are skipped; with prune=True
+    (the stream is the whole knowledge base) ids not seen in the stream are deleted.
+    Near-duplicates of an earlier document (MinHash, dedup="skip"|"merge") are not
+    embedded; "merge" lists them in the kept document's "duplicates" metadata.
+    Stage timings (read, dedup, encode, upsert) are returned under "telemetry".
+    """
+    collection = get_collection()
+    manifest = get_manifest()
+    near_dups = NearDuplicateIndex(dedup_threshold) if dedup != "off" else None
+    merged = defaultdict(list)
+    telemetry = IngestTelemetry("chroma_bridge.upsert-stream", stream=telemetry_stream)
+
+    total, batches, skipped, unchanged, duplicates = 0, 0, 0, 0, 0
+    ids, documents, metadatas, digests = [], [], [], []
+    seen = set()
+    # Per-line stages are accumulated and reported once per batch (one histogram sample per batch)
+    pending_s = {"read": 0.0, "dedup": 0.0}
+    pending_items = {"read": 0, "dedup": 0}
+
+    def close_stage(name):
+        telemetry.observe(name, pending_s[name], pending_items[name])
+        pending_s[name], pending_items[name] = 0.0, 0
+
+    def flush():
+        nonlocal total, batches
+        for name in pending_s:
+            if pending_items[name]:
+                close_stage(name)
+        with telemetry.stage("encode", items=len(ids)):
+            embeddings = get_embedding_function()(documents)
+        with telemetry.stage("upsert", items=len(ids)):
+            collection.upsert(documents=documents, embeddings=embeddings, metadatas=metadatas, ids=ids)
+        for doc_id, digest in zip(ids, digests):
+            manifest.record(doc_id, digest)
+        manifest.save()  # a crash mid-stream keeps the work done so far
+        total += len(ids)
+        batches += 1
+        telemetry.batch(count=len(ids), total=total)
+        print(json.dumps({"status": "batch", "batch": batches, "count": len(ids), "total": total}),
+              file=sys.stderr, flush=True)
+        ids.clear(); documents.clear(); metadatas.clear(); digests.clear()
+
+    for line_num, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        started = time.perf_counter()
+        try:
+            doc = json.loads(line)
+            doc_id, document, metadata = str(doc["id"]), doc["document"], doc.get("metadata") or None
+            digest = content_hash(document, metadata)
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+            skipped += 1
+            print(json.dumps({"status": "skipped", "line": line_num, "error": str(e)}), file=sys.stderr, flush=True)
+            continue
+        finally:
+            checked = time.perf_counter()
+            pending_s["read"] += checked - started
+            pending_items["read"] += 1
+        match = near_dups.check(doc_id, document) if near_dups else None
+        if near_dups:
+            pending_s["dedup"] += time.perf_counter() - checked
+            pending_items["dedup"] += 1
+        if match:
+            duplicates += 1
+            merged[match[0]].append(doc_id)
+            print(json.dumps({"status": "duplicate", "id": doc_id, "duplicate_of": match[0],
+                              "similarity": round(match[1], 3)}), file=sys.stderr, flush=True)
+            seen.add(doc_id)  # not embedded, but prune leaves whatever is indexed for it
+            continue
+        seen.add(doc_id)
+        if not full and manifest.is_unchanged(doc_id, digest):
+            unchanged += 1
+            continue
+        ids.append(doc_id); documents.append(document); metadatas.append(metadata); digests.append(digest)
+        if len(ids) >= batch_size:
+            flush()
+
+    if ids:
+        flush()
+    for name in pending_s:
+        if pending_items[name]:
+            close_stage(name)
+
+    if dedup == "merge" and merged:
+        annotate_duplicates(collection, merged)
+    deleted = prune_missing(collection, manifest, seen) if prune else 0
+    manifest.save()
+
+    for name, n in (("documents", total + unchanged + duplicates), ("embedded", total), ("unchanged", unchanged),
+                    ("duplicates", duplicates), ("skipped", skipped), ("deleted", deleted)):
+        telemetry.count(name, n)
+    result = {"status": "success", "count": total, "batches": batches, "skipped": skipped,
+              "unchanged": unchanged, "duplicates": duplicates, "deleted": deleted, "telemetry": telemetry.finish()}
+    print(json.dumps(result))
+    return result
+
+def to_chroma_where(filters):
+    """Metadata filter -> Chroma `where` clause (same format as rag_search.py filters).
+
+    {"section": "security"}               equality
+    {"section": ["Runbooks", "guides"]}   any of the values ($in)
+    {"updated": {"gte": 20260101}}        range (gt/gte/lt/lte)
+    Fields are AND-ed.
+    """
+    if not filters:
+        return None
+    clauses = []
+    for field, condition in filters.items():
+        if isinstance(condition, dict):
+            unknown = set(condition) - {"gt", "gte", "lt", "lte"}
+            if unknown or not condition:
+                raise ValueError(f"Unsupported range operator(s) for '{field}': {', '.join(sorted(unknown)) or 'none'}")
+            clauses.extend({field: {f"${op}": bound}} for op, bound in condition.items())
+        elif isinstance(condition, list):
+            clauses.append({field: {"$in": condition}})
+        else:
+            clauses.append({field: condition})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def query_knowledge(query_text, n_results=3, where=None, filters=None):
+    """Top n_results chunks; `filters` (or a raw Chroma `where`) is applied inside the query,
+    so a filtered query still returns n_results hits when enough documents match."""
+    collection = get_collection()
+    clauses = [c for c in (where, to_chroma_where(filters)) if c]
+    where = None if not clauses else clauses[0] if len(clauses) == 1 else {"$and": clauses}
 
-def query_knowledge(query_text, n_results=3):
-    client = get_client()
-    collection = client.get_or_create_collection(name=COLLECTION_NAME)
-    
     results = collection.query(
         query_texts=[query_text],
-        n_results=n_results
+        n_results=n_results,
+        where=where
     )
     
     # Flatten results for JSON output
@@ -49,14 +271,135 @@ def query_knowledge(query_text, n_results=3):
                 "distance": results["distances"][0][i] if results["distances"] else 0
             })
             
-    print(json.dumps(output))
+    return output
+
+def delete_documents(ids=None, where=None):
+    if not ids and not where:
+        raise ValueError("delete needs 'ids' or 'where'")
+    collection = get_collection()
+    if where:
+        # Resolved to ids first so their manifest entries go too (else a re-upsert is "unchanged")
+        ids = collection.get(ids=ids, where=where, include=[])["ids"]
+        if not ids:
+            return {"status": "success", "deleted": 0}
+    before = collection.count()
+    collection.delete(ids=ids)
+    manifest = get_manifest()
+    manifest.forget(ids)
+    manifest.save()
+    return {"status": "success", "deleted": before - collection.count()}
+
+def dedup_options(options):
+    """dedup / dedup_threshold from a request payload or CLI options"""
+    mode = options.get("dedup", DEDUP_MODE)
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"dedup must be one of {', '.join(DEDUP_MODES)}")
+    return {"dedup": mode, "dedup_threshold": float(options.get("dedup_threshold", DEDUP_THRESHOLD))}
+
+# --- JSON-RPC 2.0 server (newline-delimited, one request per line) ---
+RPC_METHODS = {
+    "upsert": lambda p: upsert_documents(p["documents"], p.get("metadatas"), p["ids"],
+                                         full=bool(p.get("full")), prune=bool(p.get("prune")),
+                                         telemetry_stream=p.get("telemetry_stream", TELEMETRY_STREAM),
+                                         **dedup_options(p)),
+    "query": lambda p: query_knowledge(p["query"], int(p.get("n", 3)), p.get("where"), p.get("filters")),
+    "delete": lambda p: delete_documents(p.get("ids"), p.get("where")),
+    "count": lambda p: {"count": get_collection().count()},
+    "ping": lambda p: {"status": "ok", "pid": os.getpid()},
+}
+
+def rpc_error(request_id, code, message):
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+def handle_rpc(line):
+    """Answer one JSON-RPC request line. Returns None for notifications (no "id")."""
+    try:
+        request = json.loads(line)
+    except json.JSONDecodeError as e:
+        return rpc_error(None, -32700, f"Parse error: {e}")
+    if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+        return rpc_error(None, -32600, "Invalid request")
+
+    request_id = request.get("id")
+    method = RPC_METHODS.get(request["method"])
+    if method is None:
+        return rpc_error(request_id, -32601, f"Method not found: {request['method']}")
+    params = request.get("params") or {}
+    try:
+        with _lock:
+            result = method(params)
+    except (KeyError, TypeError, ValueError) as e:
+        return rpc_error(request_id, -32602, f"Invalid params: {e}")
+    except Exception as e:
+        return rpc_error(request_id, -32000, str(e))
+    if "id" not in request:
+        return None
+    return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+def serve_stdio():
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        response = handle_rpc(line)
+        if response is not None:
+            print(json.dumps(response), flush=True)
+
+class _RPCHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = handle_rpc(line.decode("utf-8"))
+            if response is not None:
+                self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+                self.wfile.flush()
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve_socket(path=SERVE_SOCKET):
+    if os.path.exists(path):
+        os.remove(path)  # stale socket from a previous run
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with _ThreadingUnixServer(path, _RPCHandler) as server:
+        os.chmod(path, 0o600)
+        print(json.dumps({"status": "listening", "socket": path}), flush=True)
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(path)
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: chroma_bridge.py [upsert|query] [payload_json]")
+        print("Usage: chroma_bridge.py [upsert|upsert-stream|query|serve [--socket [path]]] [payload_json]")
         sys.exit(1)
         
     command = sys.argv[1]
+
+    # Long-lived JSON-RPC server: stdin/stdout, or a Unix socket with --socket [path]
+    if command == "serve":
+        # Open client + collection and load the embedding model before the first request
+        get_collection()
+        get_embedding_function()(["warm-up"])
+        try:
+            if "--socket" in sys.argv:
+                rest = sys.argv[sys.argv.index("--socket") + 1:]
+                serve_socket(rest[0] if rest else SERVE_SOCKET)
+            else:
+                serve_stdio()
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    # Streaming upsert: stdin is JSON-lines documents,
+    # optional argv[2] = {"batch_size": N, "full": bool, "prune": bool, "dedup": "skip|merge|off",
+    #                     "dedup_threshold": F, "telemetry_stream": "stderr|<file>"}
+    if command == "upsert-stream":
+        options = json.loads(sys.argv[2]) if len(sys.argv) > 2 else {}
+        upsert_stream(sys.stdin, int(options.get("batch_size", UPSERT_BATCH_SIZE)),
+                      full=bool(options.get("full")), prune=bool(options.get("prune")),
+                      telemetry_stream=options.get("telemetry_stream", TELEMETRY_STREAM), **dedup_options(options))
+        sys.exit(0)
     
     # Read payload from stdin if not provided as arg (for large JSONs)
     if len(sys.argv) > 2:
@@ -65,8 +408,12 @@ if __name__ == "__main__":
         payload = json.load(sys.stdin)
 
     if command == "upsert":
-        upsert_documents(payload["documents"], payload["metadatas"], payload["ids"])
+        print(json.dumps(upsert_documents(payload["documents"], payload["metadatas"], payload["ids"],
+                                          full=bool(payload.get("full")), prune=bool(payload.get("prune")),
+                                          telemetry_stream=payload.get("telemetry_stream", TELEMETRY_STREAM),
+                                          **dedup_options(payload))))
     elif command == "query":
-        query_knowledge(payload["query"], payload.get("n", 3))
+        print(json.dumps(query_knowledge(payload["query"], payload.get("n", 3), payload.get("where"),
+                                         payload.get("filters"))))
     else:
         print(f"Unknown command: {command}")
@@ -3,44 +3,200 @@
 KB Security Scanner - Layer 4 Defense
 Scans Knowledge Base files for suspicious patterns and prompt injection attempts.
 Designed to run as pre-commit hook or daily audit.
+
+Accepts files, directories (*.jsonl recipes and *.md Wiki pages) and globs.
+Files are sharded across a process pool, large ones by byte range on line
+boundaries, and the per-shard results are merged into one report. Recipes are
+matched field by field (string leaves of the parsed JSON, never re-serialized)
+and each finding reports its JSON path, e.g. steps[2].
+
+Matching is linear in the line length (no regex backtracking over '.*' gaps),
+and every line has a size and a time budget: lines that exceed one are
+truncated or stop matching, are reported, and fail the scan.
+
+Findings are cached per line content hash (kb_scan_cache.py), and --staged /
+--since REF scan only the lines added or modified according to `git diff`, so
+the pre-commit hook costs the size of the diff, not the size of the KB.
 """
 
+import bisect
+import glob
 import json
+import os
 import re
+import subprocess
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+from kb_scan_cache import DEFAULT_CACHE_PATH, ScanCache, is_disabled, line_key, ruleset_fingerprint
+
+try:
+    import ahocorasick  # optional (pyahocorasick): keyword prefilter as a single-pass automaton
+except ImportError:
+    ahocorasick = None
 
-# Dangerous patterns to detect in KB
+# Dangerous patterns to detect in KB: (regex, description, keywords).
+# keywords are lowercase literals every match of the regex contains: a recipe is
+# only run through the regex when all of its keywords occur in it.
+# Patterns with '.*' gaps run as GapPattern (same matches, linear time).
 DANGEROUS_PATTERNS = [
     # Instruction override
-    (r'IGNORA.*ISTRUZIONI', 'Instruction override (IT)'),
-    (r'IGNORE.*INSTRUCTIONS', 'Instruction override (EN)'),
-    (r'OVERRIDE.*RULES', 'Rule override'),
-    (r'DISREGARD.*PREVIOUS', 'Previous instruction disregard'),
+    (r'IGNORA.*ISTRUZIONI', 'Instruction override (IT)', ('ignora', 'istruzioni')),
+    (r'IGNORE.*INSTRUCTIONS', 'Instruction override (EN)', ('ignore', 'instructions')),
+    (r'OVERRIDE.*RULES', 'Rule override', ('override', 'rules')),
+    (r'DISREGARD.*PREVIOUS', 'Previous instruction disregard', ('disregard', 'previous')),
     
     # Hidden instructions
-    (r'\[HIDDEN\]', 'Hidden marker'),
-    (r'<!--.*OVERRIDE.*-->', 'HTML comment override'),
-    (r'/\*\s*INJECT\s*\*/', 'Code comment injection'),
+    (r'\[HIDDEN\]', 'Hidden marker', ('[hidden]',)),
+    (r'<!--.*OVERRIDE.*-->', 'HTML comment override', ('<!--', 'override', '-->')),
+    (r'/\*\s*INJECT\s*\*/', 'Code comment injection', ('inject',)),
     
     # Hardcoded credentials
-    (r'password\s*=\s*["\'][^"\']{8,}["\']', 'Hardcoded password'),
-    (r'api[_-]?key\s*=\s*["\'][^"\']+["\']', 'Hardcoded API key'),
-    (r'secret\s*=\s*["\'][^"\']+["\']', 'Hardcoded secret'),
+    (r'password\s*=\s*["\'][^"\']{8,}["\']', 'Hardcoded password', ('password',)),
+    (r'api[_-]?key\s*=\s*["\'][^"\']+["\']', 'Hardcoded API key', ('api', 'key')),
+    (r'secret\s*=\s*["\'][^"\']+["\']', 'Hardcoded secret', ('secret',)),
     
     # Privilege escalation
-    (r'GRANT\s+ALL.*PUBLIC', 'Excessive privilege grant'),
-    (r'CREATE\s+USER.*admin', 'Admin user creation'),
-    (r'ALTER\s+USER.*sysadmin', 'Sysadmin privilege'),
+    (r'GRANT\s+ALL.*PUBLIC', 'Excessive privilege grant', ('grant', 'all', 'public')),
+    (r'CREATE\s+USER.*admin', 'Admin user creation', ('create', 'user', 'admin')),
+    (r'ALTER\s+USER.*sysadmin', 'Sysadmin privilege', ('alter', 'user', 'sysadmin')),
     
     # Suspicious commands
-    (r'xp_cmdshell', 'SQL command shell'),
-    (r'exec\s*\(\s*["\']DROP', 'Dynamic DROP execution'),
-    (r'bypass.*approval', 'Approval bypass'),
-    (r'skip.*validation', 'Validation skip'),
+    (r'xp_cmdshell', 'SQL command shell', ('xp_cmdshell',)),
+    (r'exec\s*\(\s*["\']DROP', 'Dynamic DROP execution', ('exec', 'drop')),
+    (r'bypass.*approval', 'Approval bypass', ('bypass', 'approval')),
+    (r'skip.*validation', 'Validation skip', ('skip', 'validation')),
 ]
 
+# Characters IGNORECASE matches to an ASCII keyword letter that str.lower() does not map to it
+CASE_FOLD = str.maketrans({'\u0130': 'i', '\u0131': 'i', '\u017f': 's'})
+CASE_FOLD_RE = re.compile('[\u0130\u0131\u017f]')
+
+class GapPattern:
+    """Linear-time equivalent of a regex whose parts are joined by '.*' (IGNORE.*INSTRUCTIONS).
+
+    re backtracks over each '.*' from every start position: quadratic on a line
+    repeating the first part, cubic with two gaps. findall() returns the same
+    matches without backtracking. A greedy match starts at the leftmost occurrence
+    of the first part. Each further part must follow the previous one on the same
+    line, and the match ends at the last occurrence of the final part on that line.
+    When an occurrence does not match, later ones ending on the same line cannot
+    either, and they are skipped without searching the gap again.
+    Parts are words or markers that neither overlap themselves nor span lines.
+
+    dotall=True lets the gaps cross newlines (re.DOTALL): recipe fields hold
+    multi-line text that the scanner used to see as one serialized line.
+    """
+
+    def __init__(self, pattern: str, flags: int = 0):
+        self.pattern = pattern
+        self.parts = [re.compile(part, flags) for part in pattern.split('.*')]
+
+    @staticmethod
+    def applies(pattern: str) -> bool:
+        parts = pattern.split('.*')
+        return len(parts) > 1 and all(part and not part.endswith('\\') for part in parts)
+
+    def findall(self, text: str, dotall: bool = False) -> List[str]:
+        first, middle, last = self.parts[0], self.parts[1:-1], self.parts[-1]
+        matches, pos, size, dead_end = [], 0, len(text), -1
+        while pos <= size:
+            start = first.search(text, pos)
+            if start is None:
+                break
+            pos = start.start() + 1
+            if start.end() <= dead_end:
+                continue  # ends on a line whose earlier occurrence already failed
+            line_end = -1 if dotall else text.find('\n', start.end())
+            if line_end < 0:
+                line_end = size
+            cursor = start.end()
+            for part in middle:
+                found = part.search(text, cursor, line_end)
+                if found is None:
+                    break
+                cursor = found.end()
+            else:
+                end = None
+                for found in last.finditer(text, cursor, line_end):
+                    end = found.end()
+                if end is not None:
+                    matches.append(text[start.start():end])
+                    pos = end
+                    continue
+            dead_end = line_end
+        return matches
+
+class LineBudget:
+    """Time budget of one line: matching stops once it is spent"""
+
+    def __init__(self, ms: float):
+        self.deadline = time.perf_counter() + ms / 1000
+        self.exceeded = False
+
+    def spent(self) -> bool:
+        if not self.exceeded and time.perf_counter() > self.deadline:
+            self.exceeded = True
+        return self.exceeded
+
+class MultiPatternMatcher:
+    """DANGEROUS_PATTERNS compiled once, behind a keyword prefilter.
+
+    One pass over the case-folded text finds which keywords occur (Aho-Corasick
+    automaton when pyahocorasick is installed, C substring search otherwise);
+    only the patterns whose keywords are all present run their regex.
+    """
+
+    def __init__(self, patterns=DANGEROUS_PATTERNS):
+        self.patterns = [(pattern, description,
+                          GapPattern(pattern, re.IGNORECASE) if GapPattern.applies(pattern)
+                          else re.compile(pattern, re.IGNORECASE),
+                          frozenset(keywords))
+                         for pattern, description, keywords in patterns]
+        self.keywords = sorted(set().union(*(keywords for *_, keywords in self.patterns)))
+        self.engine = 'aho-corasick' if ahocorasick else 'substring'
+        self._automaton = None
+        if ahocorasick:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                self._automaton.add_word(keyword, keyword)
+            self._automaton.make_automaton()
+
+    def keywords_in(self, text: str) -> set:
+        if not text.isascii() and CASE_FOLD_RE.search(text):
+            text = text.translate(CASE_FOLD)
+        folded = text.lower()
+        if self._automaton is not None:
+            return {keyword for _, keyword in self._automaton.iter(folded)}
+        return {keyword for keyword in self.keywords if keyword in folded}
+
+    def candidates(self, text: str) -> list:
+        """Patterns whose keywords all occur in text (the only ones that can match)"""
+        present = self.keywords_in(text)
+        return [entry for entry in self.patterns if entry[3] <= present]
+
+    def findall(self, text: str, candidates: Optional[list] = None, budget: Optional[LineBudget] = None,
+                dotall: bool = False):
+        """Yield (pattern, description, matches) for every pattern found in text.
+
+        candidates: result of candidates() over a text containing this one (skips the prefilter)
+        budget: stop before the next pattern once the line's time budget is spent
+        dotall: '.*' gaps cross newlines (multi-line recipe fields)
+        """
+        if candidates is None:
+            candidates = self.candidates(text)
+        for pattern, description, regex, _ in candidates:
+            if budget is not None and budget.spent():
+                return
+            matches = regex.findall(text, dotall) if isinstance(regex, GapPattern) else regex.findall(text)
+            if matches:
+                yield pattern, description, matches
+
+MATCHER = MultiPatternMatcher()
+
 # Severity levels
 SEVERITY_CRITICAL = 'critical'
 SEVERITY_HIGH = 'high'
@@ -61,51 +217,317 @@ def get_severity(pattern_description: str) -> str:
     else:
         return SEVERITY_MEDIUM
 
-def scan_recipe(recipe: Dict[str, Any], recipe_id: str) -> List[Dict]:
-    """Scan a single recipe for security violations"""
-    violations = []
-    
-    # Convert recipe to string for scanning
-    recipe_str = json.dumps(recipe, ensure_ascii=False)
-    
-    for pattern, description in DANGEROUS_PATTERNS:
-        matches = re.findall(pattern, recipe_str, re.IGNORECASE)
-        if matches:
-            severity = get_severity(description)
-            violations.append({
-                'recipe_id': recipe_id,
-                'pattern': pattern,
-                'description': description,
-                'matches': matches[:3],  # Limit to first 3 matches
-                'severity': severity,
-                'count': len(matches)
-            })
-    
+# Files larger than this are split into byte ranges scanned in parallel
+SHARD_BYTES = int(os.environ.get('KB_SCAN_SHARD_BYTES', 4 * 1024 * 1024))
+
+# Pathological-input guards: longer lines are truncated and matched as plain text,
+# a line stops matching once its time budget is spent
+MAX_LINE_BYTES = int(os.environ.get('KB_SCAN_MAX_LINE_BYTES', 1024 * 1024))
+LINE_BUDGET_MS = float(os.environ.get('KB_SCAN_LINE_BUDGET_MS', 2000))
+
+# Directory scans: KB recipe files (one JSON recipe per line) and Wiki pages (plain text)
+SCAN_SUFFIXES = ('.jsonl', '.md')
+
+IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+def json_path(parent: str, key) -> str:
+    """steps[2], verify[0], metadata.owner, metadata["odd key"]"""
+    if isinstance(key, int):
+        return f'{parent}[{key}]'
+    if IDENTIFIER_RE.match(key):
+        return f'{parent}.{key}' if parent else key
+    return f'{parent}[{json.dumps(key, ensure_ascii=False)}]'
+
+def iter_strings(value) -> tuple:
+    """(JSON path, text) for every string leaf of a parsed recipe, in document order.
+
+    Object keys are yielded too (with the path of their member): a key is as
+    able to carry an injected instruction as a value.
+    """
+    stack = [('', value)]
+    while stack:
+        path, value = stack.pop()
+        if isinstance(value, str):
+            yield path or '$', value
+        elif isinstance(value, dict):
+            children = []
+            for key, child in value.items():
+                child_path = json_path(path, key)
+                children.append((child_path, key))
+                children.append((child_path, child))
+            stack.extend(reversed(children))
+        elif isinstance(value, list):
+            stack.extend(reversed([(json_path(path, i), child) for i, child in enumerate(value)]))
+
+def violation(recipe_id: Optional[str], path: Optional[str], pattern: str, description: str,
+              matches: list) -> Dict[str, Any]:
+    return {
+        'recipe_id': recipe_id,
+        'path': path,
+        'pattern': pattern,
+        'description': description,
+        'matches': matches[:3],  # Limit to first 3 matches
+        'severity': get_severity(description),
+        'count': len(matches)
+    }
+
+def scan_text(text: str, recipe_id: Optional[str], budget: Optional[LineBudget] = None) -> List[Dict]:
+    """Scan one text line (Wiki page) for security violations"""
+    return [violation(recipe_id, None, pattern, description, matches)
+            for pattern, description, matches in MATCHER.findall(text, budget=budget)]
+
+def scan_recipe(recipe: Any, recipe_id: Optional[str], raw: Optional[str] = None,
+                budget: Optional[LineBudget] = None) -> List[Dict]:
+    """Scan the string fields of a single recipe; violations carry the JSON path of the field.
+
+    raw is the recipe's JSON line: when given (and free of \\u escapes, which could
+    spell a keyword the raw text does not contain) the keyword prefilter runs once
+    over the line, and a clean recipe is never walked at all.
+
+    Gap patterns cross newlines inside a field, and a gap pattern no single field
+    matches is run once more over all fields joined, so an injection split across
+    fields ("please IGNORE" ... "the INSTRUCTIONS above") is still reported, with
+    the path of its first and last field ("title..steps[0]").
+    """
+    candidates = None
+    if raw is not None and '\\u' not in raw:
+        candidates = MATCHER.candidates(raw)
+        if not candidates:
+            return []
+    violations, found_patterns = [], set()
+    leaves = list(iter_strings(recipe))
+    for path, text in leaves:
+        if budget is not None and budget.spent():
+            break
+        for pattern, description, matches in MATCHER.findall(text, candidates, budget, dotall=True):
+            violations.append(violation(recipe_id, path, pattern, description, matches))
+            found_patterns.add(pattern)
+
+    if len(leaves) < 2:
+        return violations
+    joined = '\n'.join(text for _, text in leaves)
+    cross = [entry for entry in (candidates if candidates is not None else MATCHER.candidates(joined))
+             if isinstance(entry[2], GapPattern) and entry[0] not in found_patterns]
+    if not cross:
+        return violations
+    starts, offset = [], 0
+    for _, text in leaves:
+        starts.append(offset)
+        offset += len(text) + 1
+    for pattern, description, matches in MATCHER.findall(joined, cross, budget, dotall=True):
+        # A match inside one field was found above: these all span fields
+        at = joined.find(matches[0])
+        first = leaves[bisect.bisect_right(starts, at) - 1][0]
+        last = leaves[bisect.bisect_right(starts, at + len(matches[0]) - 1) - 1][0]
+        violations.append(violation(recipe_id, f'{first}..{last}', pattern, description, matches))
     return violations
 
-def scan_kb_file(kb_file: Path) -> Dict[str, Any]:
-    """Scan entire KB file"""
-    all_violations = []
-    total_recipes = 0
-    
-    try:
-        with open(kb_file, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                if not line.strip():
-                    continue
-                    
-                try:
-                    recipe = json.loads(line)
-                    total_recipes += 1
-                    recipe_id = recipe.get('id', f'line-{line_num}')
-                    violations = scan_recipe(recipe, recipe_id)
-                    all_violations.extend(violations)
-                except json.JSONDecodeError as e:
-                    print(f"⚠️  Invalid JSON at line {line_num}: {e}", file=sys.stderr)
-    
-    except FileNotFoundError:
-        print(f"❌ File not found: {kb_file}", file=sys.stderr)
-        return {'error': 'file_not_found', 'success': False}
+# Bump when scan_line() output changes for the same line: invalidates cached findings
+CACHE_VERSION = 3
+RULESET = ruleset_fingerprint([CACHE_VERSION, DANGEROUS_PATTERNS])
+
+_SCAN_CACHE = None    # ScanCache of this process (None = caching off)
+_CACHE_ENTRIES = []   # (key, violations) computed since the last drain, written by the parent
+
+def open_cache(cache_path: Optional[str]) -> Optional[ScanCache]:
+    """Open the findings cache for this process; also the process pool initializer"""
+    global _SCAN_CACHE
+    # A connection inherited through fork() must not be reused: always open a fresh one
+    _SCAN_CACHE = None if is_disabled(cache_path) else ScanCache(cache_path, RULESET)
+    return _SCAN_CACHE
+
+def scan_line(line: bytes, recipes_file: bool) -> tuple:
+    """(violations, error, guard) for one line without its newline.
+
+    Invalid JSON gives (None, error, None). guard lists why a line was not fully
+    scanned ('truncated': over MAX_LINE_BYTES, only the head is matched, as plain
+    text; 'timeout': LINE_BUDGET_MS spent); guarded lines are never cached.
+    """
+    budget = LineBudget(LINE_BUDGET_MS)
+    if len(line) > MAX_LINE_BYTES:
+        found = scan_text(line[:MAX_LINE_BYTES].decode('utf-8', errors='replace'), None, budget)
+        return found, None, ['truncated'] + (['timeout'] if budget.exceeded else [])
+    key = None
+    if _SCAN_CACHE is not None:
+        key = line_key('recipe' if recipes_file else 'text', line)
+        cached = _SCAN_CACHE.get(key)
+        if cached is not None:
+            return cached, None, None
+    text = line.decode('utf-8', errors='replace')
+    if not recipes_file:
+        found = scan_text(text, None, budget)
+    else:
+        try:
+            recipe = json.loads(text)
+        except json.JSONDecodeError as e:
+            return None, str(e), None
+        except RecursionError:
+            return None, 'nesting too deep', None
+        found = scan_recipe(recipe, recipe.get('id') if isinstance(recipe, dict) else None, text, budget)
+    if budget.exceeded:
+        return found, None, ['timeout']
+    if key is not None:
+        _CACHE_ENTRIES.append((key, [dict(v) for v in found]))
+    return found, None, None
+
+def scan_lines(path: str, start: int, numbered_lines) -> Dict[str, Any]:
+    """Scan (line number, bytes) pairs of one file into a shard result"""
+    recipes_file = path.endswith('.jsonl')
+    hits = _SCAN_CACHE.hits if _SCAN_CACHE is not None else 0
+    violations, warnings, guarded = [], [], []
+    lines = recipes = 0
+    for line_num, line in numbered_lines:
+        lines += 1
+        line = line.rstrip(b'\r\n')
+        if not line.strip():
+            continue
+        found, error, guard = scan_line(line, recipes_file)
+        if error is not None:
+            warnings.append((line_num, error))
+            continue
+        if guard:
+            guarded.append({'file': path, 'line': line_num, 'bytes': len(line), 'reasons': guard})
+        recipes += recipes_file
+        for v in found:
+            v['file'] = path
+            v['line'] = line_num
+        violations.extend(found)
+    cache_entries = _CACHE_ENTRIES[:]
+    del _CACHE_ENTRIES[:]
+    return {'file': path, 'start': start, 'lines': lines, 'recipes': recipes,
+            'violations': violations, 'warnings': warnings, 'guarded': guarded, 'cache_entries': cache_entries,
+            'cache_hits': (_SCAN_CACHE.hits - hits) if _SCAN_CACHE is not None else 0}
+
+def read_range(path: str, start: int, end: int):
+    """(relative line number, bytes) for the lines between two byte offsets"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        pos = start
+        line_num = 0
+        while pos < end:
+            raw = f.readline()
+            if not raw:
+                break
+            pos += len(raw)
+            line_num += 1
+            yield line_num, raw
+
+def scan_range(task) -> Dict[str, Any]:
+    """Scan the lines of one file between two byte offsets (both on line boundaries).
+
+    Line numbers are relative to `start`; merge_results() makes them absolute.
+    """
+    path, start, end = task
+    return scan_lines(path, start, read_range(path, start, end))
+
+def split_file(path: str, shard_bytes: int = SHARD_BYTES) -> List[tuple]:
+    """(path, start, end) byte ranges of about shard_bytes, cut at the next line start"""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for offset in range(shard_bytes, size, shard_bytes):
+            if offset <= bounds[-1]:
+                continue
+            f.seek(offset - 1)
+            f.readline()  # finish the line holding offset - 1
+            if f.tell() >= size:
+                break
+            bounds.append(f.tell())
+    bounds.append(size)
+    return [(path, a, b) for a, b in zip(bounds, bounds[1:])] or [(path, 0, 0)]
+
+def resolve_paths(targets: List[str]) -> tuple:
+    """Expand files, directories and globs into (files, missing targets)"""
+    files, missing = [], []
+    for target in targets:
+        path = Path(target)
+        if path.is_dir():
+            found = sorted(str(p) for p in path.rglob('*')
+                           if p.is_file() and p.suffix in SCAN_SUFFIXES
+                           and not any(part.startswith('.') for part in p.relative_to(path).parts))
+        elif path.is_file():
+            found = [str(path)]
+        else:
+            found = sorted(p for p in glob.glob(target, recursive=True) if os.path.isfile(p))
+        if not found:
+            missing.append(target)
+        files.extend(f for f in found if f not in files)
+    return files, missing
+
+# @@ -old[,count] +new[,count] @@
+HUNK_RE = re.compile(rb'^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@')
+
+def git_changed_lines(targets: List[str], ref: Optional[str] = None, staged: bool = False) -> Dict[str, List[tuple]]:
+    """Added/modified lines per tracked file from `git diff -U0`: {path: [(line number, bytes)]}.
+
+    staged compares the index (what is being committed) instead of the working tree.
+    Diff paths are relative to the repository root; they are returned relative to the
+    current directory, so targets outside it (../) are matched too.
+    """
+    top = subprocess.run(['git', 'rev-parse', '--show-toplevel'], capture_output=True, check=False)
+    if top.returncode != 0:
+        raise RuntimeError(top.stderr.decode('utf-8', errors='replace').strip())
+    root = top.stdout.decode('utf-8', errors='replace').strip()
+
+    cmd = ['git', '-c', 'core.quotepath=off', 'diff', '-U0', '--no-color', '--no-ext-diff',
+           '--no-prefix', '--diff-filter=AMR']
+    if staged:
+        cmd.append('--cached')
+    if ref:
+        cmd.append(ref)
+    proc = subprocess.run(cmd + ['--'] + targets, capture_output=True, check=False)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode('utf-8', errors='replace').strip())
+
+    changes, path, line_num, in_header = {}, None, 0, False
+    for raw in proc.stdout.split(b'\n'):
+        if raw.startswith(b'diff --git '):
+            path, in_header = None, True
+        elif in_header and raw.startswith(b'+++ '):
+            name = raw[4:].decode('utf-8', errors='replace').rstrip('\t')
+            path = os.path.relpath(os.path.join(root, name)) if name.endswith(SCAN_SUFFIXES) else None
+        elif raw.startswith(b'@@ '):
+            in_header = False
+            line_num = int(HUNK_RE.match(raw).group(1))
+        elif not in_header and raw.startswith(b'+') and path is not None:
+            changes.setdefault(path, []).append((line_num, raw[1:]))
+            line_num += 1
+    return changes
+
+def merge_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Concatenate shard results in file order, making line numbers absolute"""
+    violations, guarded, total_recipes, total_lines = [], [], 0, 0
+    line_offset = {}
+    for r in sorted(results, key=lambda r: (r['file'], r['start'])):
+        offset = line_offset.get(r['file'], 0)
+        line_offset[r['file']] = offset + r['lines']
+        total_lines += r['lines']
+        total_recipes += r['recipes']
+        for line, error in r['warnings']:
+            print(f"⚠️  Invalid JSON at {r['file']}:{offset + line}: {error}", file=sys.stderr)
+        for g in r['guarded']:
+            g['line'] += offset
+            guarded.append(g)
+        for v in r['violations']:
+            v['line'] += offset
+            if v['recipe_id'] is None:
+                v['recipe_id'] = f"line-{v['line']}"
+            violations.append(v)
+    return {'violations': violations, 'guarded': guarded, 'total_recipes': total_recipes, 'total_lines': total_lines}
+
+def build_report(results: List[Dict[str, Any]], targets: List[str], files: List[str],
+                 missing: List[str], cache: Optional[ScanCache], **extra) -> Dict[str, Any]:
+    """Merge shard results, store new cache entries and categorize by severity"""
+    cache_stats = None
+    if cache is not None:
+        cache.put_many(e for r in results for e in r['cache_entries'])
+        hits = sum(r['cache_hits'] for r in results)
+        lookups = hits + sum(len(r['cache_entries']) for r in results)
+        cache_stats = {'hits': hits, 'misses': lookups - hits,
+                       'hit_rate': round(hits / lookups, 4) if lookups else 0.0, 'path': str(cache.path)}
+        cache.close()
+    merged = merge_results(results)
+    all_violations = merged['violations']
     
     # Categorize by severity
     critical = [v for v in all_violations if v['severity'] == SEVERITY_CRITICAL]
@@ -113,31 +535,81 @@ def scan_kb_file(kb_file: Path) -> Dict[str, Any]:
     medium = [v for v in all_violations if v['severity'] == SEVERITY_MEDIUM]
     
     return {
-        'success': len(all_violations) == 0,
-        'total_recipes': total_recipes,
+        'success': len(all_violations) == 0 and not merged['guarded'] and not missing,
+        'total_recipes': merged['total_recipes'],
+        'total_lines': merged['total_lines'],
         'total_violations': len(all_violations),
         'critical': critical,
         'high': high,
         'medium': medium,
-        'file': str(kb_file)
+        'guarded': merged['guarded'],
+        'file': ' '.join(str(t) for t in targets),
+        'files': files,
+        'missing': missing,
+        'cache': cache_stats,
+        **extra
     }
 
+def scan_paths(targets: List[str], workers: Optional[int] = None, shard_bytes: int = SHARD_BYTES,
+               cache_path: Optional[str] = None) -> Dict[str, Any]:
+    """Scan files/directories/globs in parallel and build the severity report"""
+    files, missing = resolve_paths([str(t) for t in targets])
+    for target in missing:
+        print(f"❌ File not found: {target}", file=sys.stderr)
+    if missing and not files:
+        return {'error': 'file_not_found', 'success': False}
+
+    cache = open_cache(cache_path)
+    tasks = [task for path in files for task in split_file(path, shard_bytes)]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        results = [scan_range(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=open_cache, initargs=(cache_path,)) as pool:
+            results = list(pool.map(scan_range, tasks))
+    return build_report(results, targets, files, missing, cache, shards=len(tasks), workers=max(workers, 1))
+
+def scan_diff(targets: List[str], ref: Optional[str] = None, staged: bool = False,
+              cache_path: Optional[str] = None) -> Dict[str, Any]:
+    """Scan only the lines added or modified relative to `ref` (or HEAD for the index)"""
+    try:
+        changes = git_changed_lines([str(t) for t in targets], ref, staged)
+    except (OSError, RuntimeError) as e:
+        return {'error': f'git diff failed: {e}', 'success': False}
+    cache = open_cache(cache_path)
+    results = [scan_lines(path, 0, lines) for path, lines in sorted(changes.items())]
+    base = ref or ('HEAD' if staged else 'index')
+    return build_report(results, targets, sorted(changes), [], cache,
+                        diff={'base': base, 'staged': staged})
+
+def scan_kb_file(kb_file: Path) -> Dict[str, Any]:
+    """Scan entire KB file"""
+    return scan_paths([kb_file], workers=1)
+
 def print_report(result: Dict[str, Any]):
     """Print scan results in human-readable format"""
-    if not result.get('success', True):
-        if result.get('error') == 'file_not_found':
+    if 'error' in result:
+        if result['error'] == 'file_not_found':
             return
-        print(f"❌ Scan failed: {result.get('error')}", file=sys.stderr)
+        print(f"❌ Scan failed: {result['error']}", file=sys.stderr)
         return
     
-    if result['total_violations'] == 0:
+    scanned = f"{result['total_recipes']} recipes"
+    if result.get('diff'):
+        scanned = (f"{result['total_lines']} changed lines ({result['total_recipes']} recipes) "
+                   f"in {len(result['files'])} files vs {result['diff']['base']}")
+    elif len(result['files']) > 1:
+        scanned += f" / {result['total_lines']} lines in {len(result['files'])} files"
+    if result['total_violations'] == 0 and result['success']:
         print(f"✅ KB scan passed: {result['file']}")
-        print(f"   Scanned {result['total_recipes']} recipes, no violations found")
+        print(f"   Scanned {scanned}, no violations found")
+        if result.get('cache'):
+            print(f"   Cache: {result['cache']['hits']} hits, {result['cache']['misses']} misses")
         return
     
     # Print header
     print(f"\n🚨 KB SECURITY SCAN FAILED: {result['file']}", file=sys.stderr)
-    print(f"   Total recipes: {result['total_recipes']}", file=sys.stderr)
+    print(f"   Scanned: {scanned}", file=sys.stderr)
     print(f"   Total violations: {result['total_violations']}", file=sys.stderr)
     
     # Print by severity
@@ -153,26 +625,53 @@ def print_report(result: Dict[str, Any]):
         print(f"\n{severity_icon} {severity_level.upper()} ({len(violations)}):", file=sys.stderr)
         
         for v in violations:
-            print(f"  Recipe: {v['recipe_id']}", file=sys.stderr)
+            print(f"  Recipe: {v['recipe_id']} ({v['file']}:{v['line']})", file=sys.stderr)
+            if v.get('path'):
+                print(f"  Field: {v['path']}", file=sys.stderr)
             print(f"  Issue: {v['description']}", file=sys.stderr)
             print(f"  Matches: {v['matches'][:2]}", file=sys.stderr)
             if v['count'] > 2:
                 print(f"  (+ {v['count'] - 2} more)", file=sys.stderr)
             print(file=sys.stderr)
+    
+    if result['guarded']:
+        print(f"\n⚠️  NOT FULLY SCANNED ({len(result['guarded'])}):", file=sys.stderr)
+        for g in result['guarded']:
+            reasons = []
+            if 'truncated' in g['reasons']:
+                reasons.append(f"truncated to {MAX_LINE_BYTES} bytes")
+            if 'timeout' in g['reasons']:
+                reasons.append(f"matching stopped after {LINE_BUDGET_MS:g} ms")
+            print(f"  {g['file']}:{g['line']} ({g['bytes']} bytes): {', '.join(reasons)}", file=sys.stderr)
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: kb-security-scan.py <kb-file> [--json]", file=sys.stderr)
+        print("Usage: kb-security-scan.py <kb-file|dir|glob> [...] [--json] [--workers N]", file=sys.stderr)
+        print("                           [--staged | --since REF] [--cache PATH|off]", file=sys.stderr)
         print("\nExample:", file=sys.stderr)
         print("  python3 kb-security-scan.py agents/kb/recipes.jsonl", file=sys.stderr)
+        print("  python3 kb-security-scan.py 'agents/kb/*.jsonl' Wiki/ --workers 8", file=sys.stderr)
+        print("  python3 kb-security-scan.py --staged agents/kb/", file=sys.stderr)
         sys.exit(1)
     
-    kb_file = Path(sys.argv[1])
-    json_output = '--json' in sys.argv
+    import argparse
+    parser = argparse.ArgumentParser(prog='kb-security-scan.py')
+    parser.add_argument('targets', nargs='+', help='KB files, directories or glob patterns')
+    parser.add_argument('--json', action='store_true', help='Output the report as JSON')
+    parser.add_argument('--workers', type=int, help='Scan processes (default: CPU count)')
+    parser.add_argument('--staged', action='store_true',
+                        help='Scan only lines added/modified in the index (pre-commit hook)')
+    parser.add_argument('--since', metavar='REF', help='Scan only lines added/modified since a git ref')
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH,
+                        help='Findings cache file, or "off" (default: $KB_SCAN_CACHE or %(default)s)')
+    args = parser.parse_args()
     
-    result = scan_kb_file(kb_file)
+    if args.staged or args.since:
+        result = scan_diff(args.targets, args.since, args.staged, args.cache)
+    else:
+        result = scan_paths(args.targets, args.workers, cache_path=args.cache)
     
-    if json_output:
+    if args.json:
         print(json.dumps(result, indent=2))
     else:
         print_report(result)
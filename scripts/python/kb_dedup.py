@@ -0,0 +1,108 @@
+"""
+KB Near-Duplicate Detection
+MinHash signatures over word 3-shingles plus LSH banding, so near-identical
+documents (copied templates, translated stubs with the same skeleton) can be
+skipped or merged before they are embedded.
+
+Used by chroma_bridge.py and scripts/ai-agent/chromadb_manager.py. Scope is one
+ingestion run: the first document of a group (in input order) is kept, later
+ones whose estimated Jaccard similarity reaches the threshold are duplicates.
+Off unless KB_DEDUP_MODE or the caller asks for it (dropping ids the caller
+passed changes what an upsert writes).
+"""
+
+import hashlib
+import os
+import re
+from collections import defaultdict
+
+import numpy as np
+
+DEDUP_THRESHOLD = float(os.environ.get("KB_DEDUP_THRESHOLD", "0.9"))
+DEDUP_MODES = ("skip", "merge", "off")
+DEDUP_MODE = os.environ.get("KB_DEDUP_MODE", "off")
+
+NUM_PERM = 128
+BANDS = 16          # 16 bands x 8 rows: pairs below ~0.7 Jaccard rarely become candidates
+SHINGLE_WORDS = 3
+
+_PRIME = np.uint64((1 << 61) - 1)
+_WORD_RE = re.compile(r"\w+")
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold=DEDUP_THRESHOLD, num_perm=NUM_PERM, bands=BANDS, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        # Universal hashing h(x) = (a*x + b) mod p over 32-bit shingle hashes (no uint64 overflow)
+        self._a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._buckets = defaultdict(list)   # (band, band hash) -> [doc_id]
+        self._signatures = {}               # doc_id -> signature
+
+    def signature(self, text):
+        """MinHash signature (uint64[num_perm]); None when the text has no words."""
+        grams = shingles(text)
+        if not grams:
+            return None
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams),
+            dtype=np.uint64, count=len(grams))
+        return (((hashes[:, None] * self._a) % _PRIME + self._b) % _PRIME).min(axis=0)
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def find(self, signature):
+        """Best indexed near-duplicate of `signature`: (doc_id, similarity) or None."""
+        candidates = {doc_id for key in self._band_keys(signature) for doc_id in self._buckets.get(key, ())}
+        best = None
+        for doc_id in candidates:
+            similarity = float(np.mean(self._signatures[doc_id] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (doc_id, similarity)
+        return best
+
+    def add(self, doc_id, signature):
+        self._signatures[doc_id] = signature
+        for key in self._band_keys(signature):
+            self._buckets[key].append(doc_id)
+
+    def check(self, doc_id, text=None, signature=None):
+        """Returns (duplicate_of, similarity) for a near-duplicate, otherwise indexes the document and returns None."""
+        if signature is None:
+            signature = self.signature(text)
+        if signature is None:
+            return None
+        match = self.find(signature)
+        if match is None:
+            self.add(doc_id, signature)
+        return match
+
+
+def annotate_duplicates(collection, duplicates, doc_id_field=None):
+    """Merge mode: record each kept document's near-duplicates in its metadata ("duplicates").
+
+    `duplicates` maps kept doc id -> [duplicate ids]. With doc_id_field, every chunk whose
+    metadata[doc_id_field] is the kept id is annotated (chunked collections).
+    """
+    for kept, dups in duplicates.items():
+        if doc_id_field:
+            found = collection.get(where={doc_id_field: kept}, include=["metadatas"])
+        else:
+            found = collection.get(ids=[kept], include=["metadatas"])
+        if found["ids"]:
+            collection.update(ids=found["ids"],
+                              metadatas=[{**(m or {}), "duplicates": ",".join(sorted(dups))} for m in found["metadatas"]])
@@ -0,0 +1,82 @@
+"""
+KB Index Manifest
+Content hash per document id for the Chroma knowledge base, so re-index runs
+only re-embed documents that changed and remove the ones that disappeared.
+
+Used by chroma_bridge.py and scripts/ai-agent/chromadb_manager.py. The manifest
+is a JSON file stored next to the Chroma data directory.
+
+A manifest can be bound to a target (the store and collection it describes, e.g.
+server address + collection id): entries recorded for another target are
+discarded on load, so a recreated collection is re-indexed instead of skipped.
+A manifest without a path lives in memory only and is never saved.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+MANIFEST_FILENAME = "index-manifest.json"
+
+
+def content_hash(document, metadata=None):
+    digest = hashlib.sha256(document.encode("utf-8"))
+    if metadata:
+        digest.update(json.dumps(metadata, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class IndexManifest:
+    def __init__(self, path, target=None):
+        self.path = Path(path).expanduser() if path else None
+        self.target = target
+        self.entries = {}  # doc_id -> {"hash": ..., "source": ...}
+        self.dirty = False
+        if self.path is not None and self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if target is None or data.get("target") == target:
+                self.entries = data.get("documents", {})
+            else:
+                self.dirty = True  # written for another store/collection: start over
+
+    @classmethod
+    def for_directory(cls, directory, target=None):
+        return cls(Path(directory).expanduser() / MANIFEST_FILENAME, target)
+
+    def is_unchanged(self, doc_id, digest):
+        entry = self.entries.get(doc_id)
+        return entry is not None and entry["hash"] == digest
+
+    def record(self, doc_id, digest, source=None):
+        self.entries[doc_id] = {"hash": digest, "source": source}
+        self.dirty = True
+
+    def forget(self, doc_ids):
+        for doc_id in doc_ids:
+            if self.entries.pop(doc_id, None) is not None:
+                self.dirty = True
+
+    def ids_from_source(self, prefix):
+        """Document ids whose recorded source lives under `prefix` (a directory)."""
+        prefix = str(prefix)
+        return [doc_id for doc_id, e in self.entries.items() if (e.get("source") or "").startswith(prefix)]
+
+    def ids_with_source(self, source):
+        """Document ids recorded for exactly this source file."""
+        source = str(source)
+        return [doc_id for doc_id, e in self.entries.items() if e.get("source") == source]
+
+    def save(self):
+        if not self.dirty or self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            manifest = {"version": 1, "documents": self.entries}
+            if self.target is not None:
+                manifest["target"] = self.target
+            json.dump(manifest, f)
+        os.replace(tmp, self.path)
+        self.dirty = False
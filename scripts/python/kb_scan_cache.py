@@ -0,0 +1,84 @@
+"""
+KB Security Scan Cache
+Findings of kb-security-scan.py keyed by a hash of each scanned line (one
+recipe per line in *.jsonl, one text line in *.md), in a SQLite file shared by
+every run on the host, so unchanged lines are never matched twice.
+
+Entries are only valid for the ruleset they were computed with: a ruleset
+fingerprint (hash of DANGEROUS_PATTERNS) is stored alongside, and the cache is
+emptied when the patterns change. Oldest entries are evicted past max_entries.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = os.getenv("KB_SCAN_CACHE", "~/.cache/easyway/kb-scan.sqlite")
+DEFAULT_MAX_ENTRIES = int(os.getenv("KB_SCAN_CACHE_MAX_ENTRIES", 2_000_000))
+
+
+def line_key(kind, line):
+    """kind: 'recipe' or 'text'; line: the line's bytes without the trailing newline."""
+    return hashlib.blake2b(kind.encode("ascii") + b"\0" + line, digest_size=16).hexdigest()
+
+
+def ruleset_fingerprint(patterns):
+    return hashlib.sha256(json.dumps(patterns, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def is_disabled(path):
+    return not path or str(path).lower() in ("off", "none", "0")
+
+
+class ScanCache:
+    def __init__(self, path, ruleset, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = Path(path).expanduser()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS findings (key TEXT PRIMARY KEY, violations TEXT NOT NULL)")
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'ruleset'").fetchone()
+        if row is None or row[0] != ruleset:
+            self._db.execute("DELETE FROM findings")
+            self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('ruleset', ?)", (ruleset,))
+        self._db.commit()
+
+    def get(self, key):
+        """Cached violations (fresh list of dicts) or None on a miss."""
+        row = self._db.execute("SELECT violations FROM findings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put_many(self, entries):
+        """entries: iterable of (key, violations) computed by the scanner."""
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO findings (key, violations) VALUES (?, ?)",
+                                 ((key, json.dumps(v, ensure_ascii=False)) for key, v in entries))
+        self._evict()
+
+    def _evict(self):
+        excess = self._db.execute("SELECT COUNT(*) FROM findings").fetchone()[0] - self.max_entries
+        if excess > 0:
+            with self._db:
+                self._db.execute("DELETE FROM findings WHERE rowid IN "
+                                 "(SELECT rowid FROM findings ORDER BY rowid LIMIT ?)", (excess,))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0, "path": str(self.path)}
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
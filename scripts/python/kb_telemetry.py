@@ -0,0 +1,130 @@
+"""
+KB Ingestion Telemetry
+Per-stage timers (read, chunk, encode, upsert, ...), counters and latency
+histograms for the knowledge-base indexers, so a slow ingestion run shows
+where the time went.
+
+Used by chroma_bridge.py and scripts/ai-agent/chromadb_manager.py:
+- summary()        JSON summary returned with the run result
+- KB_TELEMETRY_LOG one summary per run appended as a JSON line (regression history)
+- KB_TELEMETRY_STREAM per-batch records as JSON lines ("stderr" or a file path)
+
+Stage times measured in worker processes are reported with observe() and are
+summed across workers, so they can exceed the wall-clock elapsed time.
+"""
+
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+TELEMETRY_LOG = os.environ.get("KB_TELEMETRY_LOG")
+TELEMETRY_STREAM = os.environ.get("KB_TELEMETRY_STREAM")
+
+# Histogram bucket upper bounds (ms); the last bucket is open-ended
+BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+
+class StageStats:
+    def __init__(self):
+        self.samples_ms = []
+        self.items = 0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, ms, items=0):
+        self.samples_ms.append(ms)
+        self.items += items
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def summary(self, total_ms):
+        ordered = sorted(self.samples_ms)
+        spent = sum(ordered)
+        pick = lambda pct: round(ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))], 3)
+        labels = [f"le_{b}" for b in BUCKETS_MS] + ["gt_%d" % BUCKETS_MS[-1]]
+        return {
+            "calls": len(ordered),
+            "items": self.items,
+            "total_s": round(spent / 1000, 3),
+            "share_pct": round(100 * spent / total_ms, 1) if total_ms else 0.0,
+            "mean_ms": round(spent / len(ordered), 3),
+            "p50_ms": pick(50),
+            "p95_ms": pick(95),
+            "max_ms": round(ordered[-1], 3),
+            "items_per_sec": round(self.items / (spent / 1000), 1) if spent and self.items else None,
+            "histogram_ms": {label: n for label, n in zip(labels, self.buckets) if n},
+        }
+
+
+class IngestTelemetry:
+    def __init__(self, source, stream=TELEMETRY_STREAM, log_path=TELEMETRY_LOG):
+        self.source = source
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.log_path = log_path
+        self._stream = None
+        if stream:
+            self._stream = sys.stderr if stream == "stderr" else open(stream, "a", encoding="utf-8")
+        self._batch = 0
+        self._batch_ms = {}  # stage -> ms accumulated since the last batch record
+
+    @contextmanager
+    def stage(self, name, items=0):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, items)
+
+    def observe(self, name, seconds, items=0):
+        ms = seconds * 1000
+        self.stages.setdefault(name, StageStats()).add(ms, items)
+        self._batch_ms[name] = self._batch_ms.get(name, 0.0) + ms
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def batch(self, **fields):
+        """Close a batch: emit one per-batch record (stage ms since the previous batch + fields)."""
+        self._batch += 1
+        if self._stream is not None:
+            record = {"run_id": self.run_id, "source": self.source, "batch": self._batch, "ts": time.time(),
+                      "stages_ms": {k: round(v, 3) for k, v in self._batch_ms.items()}, **fields}
+            self._stream.write(json.dumps(record) + "\n")
+            self._stream.flush()
+        self._batch_ms = {}
+
+    def summary(self):
+        elapsed_ms = (time.perf_counter() - self._started) * 1000
+        stages = {name: stats.summary(elapsed_ms) for name, stats in self.stages.items()}
+        return {
+            "run_id": self.run_id,
+            "source": self.source,
+            "started_at": self.started_at,
+            "elapsed_s": round(elapsed_ms / 1000, 3),
+            "batches": self._batch,
+            "counters": dict(self.counters),
+            "stages": stages,
+            "bottleneck": max(stages, key=lambda s: stages[s]["total_s"]) if stages else None,
+        }
+
+    def finish(self):
+        """Final summary; appended to the history log when configured."""
+        summary = self.summary()
+        if self.log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(summary) + "\n")
+        if self._stream is not None and self._stream is not sys.stderr:
+            self._stream.close()
+        self._stream = None
+        return summary